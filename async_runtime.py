@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+
+class AsyncRuntime:
+    """One long-lived asyncio loop on a background thread that owns the OpenAI client"""
+
+    def __init__(self, max_connections=20, keepalive_seconds=120):
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.ready = threading.Event()
+        self._client = None
+        self.startup_error = None
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run_loop, name="asyncio-runtime", daemon=True)
+        self.thread.start()
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        # Build the client here so importing openai doesn't hold up the caller;
+        # coroutines only start running once it exists
+        try:
+            self._client = self.create_client()
+        except Exception as e:
+            self.startup_error = e
+        finally:
+            self.ready.set()
+        self.loop.run_forever()
+
+    def create_client(self):
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        # One pooled client for chat and speech. Keep idle connections open between
+        # turns (httpx drops them after 5 seconds by default) so TLS sessions are reused.
+        # Retries and deadlines are left to the engine (see resilience.py).
+        return AsyncOpenAI(max_retries=0, http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections,
+                                keepalive_expiry=self.keepalive_seconds)
+        ))
+
+    @property
+    def client(self):
+        """The shared AsyncOpenAI client, waiting for it to be created if needed"""
+        self.ready.wait()
+        if self.startup_error is not None:
+            raise self.startup_error
+        return self._client
+
+    def submit(self, coro):
+        """Schedule a coroutine on the runtime, returning a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Run a coroutine on the runtime and block until it finishes"""
+        return self.submit(coro).result()
+
+    def create_queue(self, maxsize=0):
+        """Create an asyncio.Queue that belongs to the runtime loop"""
+        async def make_queue():
+            return asyncio.Queue(maxsize)
+        return self.run(make_queue())
+
+    def stop(self):
+        """Close the client and shut the loop down"""
+        if not self.loop.is_running():
+            return
+        try:
+            if self._client is not None:
+                self.run(self._client.close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
@@ -0,0 +1,120 @@
+import threading
+from collections import deque
+import numpy as np
+
+
+class CaptureRing:
+    """Preallocated store of fixed-size int16 microphone blocks
+
+    Writers (the sounddevice callback, or the event loop for network audio)
+    copy samples of any length into the current slot; a slot is queued once
+    it holds block_size samples. The consumer's read() returns a view of a
+    queued slot, which stays valid until the next read(), so
+    nothing is copied or allocated per block on either side.
+
+    When every slot is in use, write() drops the oldest queued block, so a
+    slow decoder loses old audio rather than falling further behind.
+    push() instead waits, before each block it completes, until fewer than
+    `limit` blocks are queued, which pushes back on a network client.
+    """
+
+    def __init__(self, loop, block_size, slots, limit=0):
+        self.loop = loop
+        self.block_size = block_size
+        self.data = np.zeros((max(slots, 3), block_size), dtype=np.int16)
+        self.limit = limit or len(self.data) - 2
+        self.lock = threading.Lock()
+
+        self.free = list(range(1, len(self.data)))
+        self.queued = deque()
+        self.writing = 0     # Slot being filled
+        self.filled = 0      # Samples in it so far
+        self.held = None     # Slot last returned by read()
+
+        self.reader = None   # Future the consumer waits on
+        self.writer = None   # Future push() waits on
+        self.blocks = 0
+        self.dropped = 0
+
+    def write(self, data):
+        """Copy samples in; callable from any thread"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        with self.lock:
+            while len(samples):
+                count = min(len(samples), self.block_size - self.filled)
+                self.data[self.writing, self.filled:self.filled + count] = samples[:count]
+                self.filled += count
+                samples = samples[count:]
+                if self.filled == self.block_size:
+                    self.commit()
+            reader = self.reader
+            self.reader = None
+        if reader is not None:
+            self.loop.call_soon_threadsafe(self.wake, reader)
+
+    def commit(self):
+        self.queued.append(self.writing)
+        self.blocks += 1
+        self.filled = 0
+        if self.free:
+            self.writing = self.free.pop()
+        else:
+            # Decoding has fallen behind a live microphone; lose the oldest audio
+            self.writing = self.queued.popleft()
+            self.dropped += 1
+
+    async def push(self, data):
+        """Copy samples in from the loop a block at a time, waiting while `limit` blocks are queued
+
+        A large frame therefore never overruns the ring: nothing is dropped,
+        the sender is just held back until the decoder catches up.
+        """
+        samples = np.frombuffer(data, dtype=np.int16)
+        while len(samples):
+            while len(self.queued) >= self.limit:
+                self.writer = self.loop.create_future()
+                await self.writer
+            count = self.block_size - self.filled
+            self.write(samples[:count])
+            samples = samples[count:]
+
+    async def read(self):
+        """The next block, as a view that is valid until the next read()"""
+        while True:
+            with self.lock:
+                if self.held is not None:
+                    self.free.append(self.held)
+                    self.held = None
+                if self.queued:
+                    self.held = self.queued.popleft()
+                    break
+                self.reader = self.loop.create_future()
+                reader = self.reader
+            self.wake_writer()
+            await reader
+        self.wake_writer()
+        return self.data[self.held]
+
+    def clear(self):
+        """Forget queued audio and the partly filled block (the held one stays valid)"""
+        with self.lock:
+            self.free.extend(self.queued)
+            self.queued.clear()
+            self.filled = 0
+        self.wake_writer()
+
+    def wake_writer(self):
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            self.wake(writer)
+
+    @staticmethod
+    def wake(future):
+        if not future.done():
+            future.set_result(None)
+
+    def __len__(self):
+        return len(self.queued)
+
+    def stats(self):
+        return {"blocks": self.blocks, "dropped_blocks": self.dropped, "queued_blocks": len(self.queued)}
@@ -0,0 +1,68 @@
+import queue
+import threading
+
+
+class BatchWriter:
+    """Base for logs written from a background thread in batches
+
+    The app never waits on the disk: items go onto a bounded queue and are
+    dropped (and counted) if the writer falls behind. The writer thread
+    hands write_batch() everything that has queued up since the last batch,
+    and also calls it every flush_interval seconds while idle, if set.
+    Subclasses call start_writer() once they are set up.
+    """
+
+    def __init__(self, enabled=True, max_pending=1000, flush_interval=None):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(max_pending)
+        self.dropped = 0
+        self.thread = None
+
+    def start_writer(self, name):
+        if self.enabled:
+            self.thread = threading.Thread(target=self.write_loop, name=name, daemon=True)
+            self.thread.start()
+
+    def write(self, item):
+        if not self.enabled:
+            return
+        try:
+            self.pending.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    # Writer thread
+
+    def open_writer(self):
+        """Prepare to write, on the writer thread; False disables the log"""
+        return True
+
+    def write_batch(self, items, stop):
+        """Write one batch; stop is set for the last one"""
+        raise NotImplementedError
+
+    def write_loop(self):
+        if not self.open_writer():
+            self.enabled = False
+            return
+        while True:
+            try:
+                items = [self.pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                items = []
+            # Write whatever else is waiting in the same batch
+            while not self.pending.empty():
+                items.append(self.pending.get_nowait())
+            stop = None in items
+            self.write_batch([item for item in items if item is not None], stop)
+            if stop:
+                return
+
+    def close(self, timeout=2):
+        """Flush pending items and stop the writer"""
+        if self.thread is None:
+            return
+        self.pending.put(None)
+        self.thread.join(timeout)
+        self.thread = None
@@ -0,0 +1,231 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_REPLY = ("[PARTLY] Nice try! Serendipity means finding something good by chance, without looking for it. "
+                 "For example, meeting an old friend in a city you are only visiting is serendipity. "
+                 "Would you like to try using it in a sentence?")
+
+TTS_SAMPLE_RATE = 24000
+
+
+class FakeOpenAI:
+    """Canned Responses and speech output with configurable timing
+
+    first_token_delay   seconds before the first text delta
+    token_interval      seconds between text deltas (one word each)
+    tts_first_byte      seconds before the first PCM chunk
+    tts_speed           how many times faster than real time audio is sent
+    ms_per_char         length of synthesized speech per input character
+
+    Faults, drawn independently for each request:
+    error_rate          fraction answered with HTTP 500
+    stall_rate          fraction that wait stall_seconds before answering
+    """
+
+    def __init__(self, reply=DEFAULT_REPLY, first_token_delay=0.4, token_interval=0.02,
+                 tts_first_byte=0.25, tts_speed=4.0, ms_per_char=60,
+                 error_rate=0.0, stall_rate=0.0, stall_seconds=30.0, seed=None):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.token_interval = token_interval
+        self.tts_first_byte = tts_first_byte
+        self.tts_speed = tts_speed
+        self.ms_per_char = ms_per_char
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.random = random.Random(seed)
+        self.requests = {"responses": 0, "speech": 0}
+        self.faults = {"error": 0, "stall": 0}
+        self.lock = threading.Lock()
+
+    def count(self, kind):
+        with self.lock:
+            self.requests[kind] += 1
+
+    def pick_fault(self):
+        """"error", "stall" or None for the next request"""
+        with self.lock:
+            roll = self.random.random()
+            if roll < self.error_rate:
+                fault = "error"
+            elif roll < self.error_rate + self.stall_rate:
+                fault = "stall"
+            else:
+                return None
+            self.faults[fault] += 1
+            return fault
+
+    def speech_pcm(self, text):
+        """A quiet tone as long as the text would take to say"""
+        samples = max(1, int(len(text) * self.ms_per_char / 1000 * TTS_SAMPLE_RATE))
+        t = np.arange(samples) / TTS_SAMPLE_RATE
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)  # Syllable-like loudness changes
+        return (3000 * envelope * np.sin(2 * np.pi * 220 * t)).astype(np.int16).tobytes()
+
+    def response_object(self, text, status="completed"):
+        return {
+            "id": "resp_fake", "object": "response", "created_at": int(time.time()),
+            "model": "gpt-4o", "status": status,
+            "output": [{
+                "type": "message", "id": "msg_fake", "role": "assistant", "status": status,
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.rstrip("/")
+        try:
+            fault = self.fake.pick_fault()
+            if fault == "error":
+                self.send_json({"error": {"message": "Injected server error", "type": "server_error"}}, 500)
+                return
+            if fault == "stall":
+                time.sleep(self.fake.stall_seconds)
+            if path.endswith("/responses"):
+                self.fake.count("responses")
+                if body.get("stream"):
+                    self.stream_response()
+                else:
+                    self.send_json(self.fake.response_object(self.fake.reply))
+            elif path.endswith("/audio/speech"):
+                self.fake.count("speech")
+                self.stream_speech(body.get("input", ""))
+            else:
+                self.send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away, e.g. a cancelled prefetch
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def send_event(self, payload):
+        self.write_chunk(f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n".encode())
+
+    def stream_response(self):
+        fake = self.fake
+        self.start_chunked("text/event-stream")
+        self.send_event({"type": "response.created", "sequence_number": 0,
+                         "response": fake.response_object("", "in_progress")})
+        time.sleep(fake.first_token_delay)
+
+        words = fake.reply.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(fake.token_interval)
+            self.send_event({"type": "response.output_text.delta", "sequence_number": i + 1,
+                             "item_id": "msg_fake", "output_index": 0, "content_index": 0,
+                             "delta": word if i == 0 else " " + word})
+        self.send_event({"type": "response.completed", "sequence_number": len(words) + 1,
+                         "response": fake.response_object(fake.reply)})
+        self.end_chunked()
+
+    def stream_speech(self, text):
+        fake = self.fake
+        audio = fake.speech_pcm(text)
+        self.start_chunked("application/octet-stream")
+        time.sleep(fake.tts_first_byte)
+
+        chunk_bytes = TTS_SAMPLE_RATE // 10 * 2  # 100 ms of audio
+        for start in range(0, len(audio), chunk_bytes):
+            if start:
+                time.sleep(0.1 / fake.tts_speed)
+            self.write_chunk(audio[start:start + chunk_bytes])
+        self.end_chunked()
+
+
+class FakeOpenAIServer:
+    """Serves a FakeOpenAI on a local port from a background thread"""
+
+    def __init__(self, fake=None, host="127.0.0.1", port=0):
+        self.fake = fake or FakeOpenAI()
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self.fake
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_timing_arguments(parser):
+    parser.add_argument("--first-token-delay", type=float, default=0.4)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--tts-first-byte", type=float, default=0.25)
+    parser.add_argument("--tts-speed", type=float, default=4.0)
+
+
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with HTTP 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="fraction of requests that stall")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+
+
+def fake_from_arguments(args):
+    return FakeOpenAI(first_token_delay=args.first_token_delay, token_interval=args.token_interval,
+                      tts_first_byte=args.tts_first_byte, tts_speed=args.tts_speed,
+                      error_rate=args.error_rate, stall_rate=args.stall_rate,
+                      stall_seconds=args.stall_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI endpoints the app uses")
+    parser.add_argument("--port", type=int, default=8765)
+    add_timing_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(fake_from_arguments(args), port=args.port).start()
+    print(f"Serving on {server.base_url} (set OPENAI_BASE_URL to this)")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+        sys.exit(0)
@@ -0,0 +1,203 @@
+import os
+import json
+import asyncio
+import wave
+import time
+import threading
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Answers used when no WAV directory is given; they are spoken by the scripted recognizer
+SYNTHETIC_ANSWERS = [
+    "it means finding something nice by accident",
+    "something that only lasts a very short time",
+    "found everywhere at the same time",
+    "i am not sure maybe it is about being careful",
+    "a statement that seems to contradict itself",
+]
+
+
+class Fixture:
+    """One recorded answer: 16 kHz mono int16 audio plus an optional transcript"""
+
+    def __init__(self, name, samples, transcript=""):
+        self.name = name
+        self.samples = samples
+        self.transcript = transcript
+
+    @property
+    def seconds(self):
+        return len(self.samples) / SAMPLE_RATE
+
+
+def read_wav(path):
+    """Read a PCM WAV as 16 kHz mono int16, mixing down and resampling if needed"""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+        channels, rate = f.getnchannels(), f.getframerate()
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != SAMPLE_RATE:
+        positions = np.arange(0, len(samples), rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+    return samples
+
+
+def load_fixtures(directory):
+    """WAV files in a directory, with transcripts from matching .txt files when present"""
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".wav"):
+            continue
+        path = os.path.join(directory, name)
+        transcript_path = os.path.splitext(path)[0] + ".txt"
+        transcript = ""
+        if os.path.exists(transcript_path):
+            with open(transcript_path) as f:
+                transcript = f.read().strip()
+        fixtures.append(Fixture(name, read_wav(path), transcript))
+    return fixtures
+
+
+def synthetic_speech(seconds, seed=0):
+    """Noise shaped like speech loudness (syllables, pauses) for the energy endpointer"""
+    rng = np.random.default_rng(seed)
+    count = int(seconds * SAMPLE_RATE)
+    t = np.arange(count) / SAMPLE_RATE
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, np.pi)), 0.2, 1.0)
+    return (rng.normal(0, 2500, count) * envelope).astype(np.int16)
+
+
+def synthetic_fixtures():
+    return [Fixture(f"synthetic-{i}", synthetic_speech(0.4 * len(answer.split()), seed=i), answer)
+            for i, answer in enumerate(SYNTHETIC_ANSWERS)]
+
+
+class ScriptedRecognizer:
+    """Stands in for vosk.KaldiRecognizer by revealing a known transcript as audio arrives
+
+    Partial results grow in proportion to the audio fed so far, and the whole
+    transcript is returned by FinalResult. Used with synthetic fixtures, or
+    with recorded ones when no Vosk model is available.
+    """
+
+    def __init__(self):
+        self.transcript = ""
+        self.expected_samples = 1
+        self.fed_samples = 0
+
+    def start(self, fixture):
+        self.transcript = fixture.transcript
+        self.expected_samples = max(1, len(fixture.samples))
+        self.fed_samples = 0
+
+    def AcceptWaveform(self, data):
+        self.fed_samples += len(data) // 2
+        return False
+
+    def partial_text(self):
+        words = self.transcript.split()
+        heard = min(len(words), len(words) * self.fed_samples // self.expected_samples)
+        return " ".join(words[:heard])
+
+    def PartialResult(self):
+        return json.dumps({"partial": self.partial_text()})
+
+    def Result(self):
+        return json.dumps({"text": self.partial_text()})
+
+    def FinalResult(self):
+        text = self.transcript if self.fed_samples else ""
+        if text:
+            self.transcript = ""  # Said once; the next turn needs a new fixture
+        self.Reset()
+        return json.dumps({"text": text})
+
+    def Reset(self):
+        # Like Kaldi's, this forgets the audio heard, not what the speaker is about to say
+        self.fed_samples = 0
+
+
+class ScriptedMicrophone:
+    """Replaces sd.RawInputStream: calls the audio callback with silence or a fixture
+
+    Blocks are delivered at real-time pace from a background thread. play()
+    queues a fixture to be "spoken"; silence follows it so the endpointer
+    can end the turn.
+    """
+
+    def __init__(self, callback, block_size):
+        self.callback = callback
+        self.block_size = block_size
+        self.samples = np.zeros(0, dtype=np.int16)
+        self.position = 0
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def play(self, samples):
+        with self.lock:
+            self.samples = samples
+            self.position = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.feed, name="scripted-mic", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+    def close(self):
+        self.stop()
+
+    def next_block(self):
+        with self.lock:
+            block = self.samples[self.position:self.position + self.block_size]
+            self.position += len(block)
+        if len(block) < self.block_size:
+            block = np.concatenate([block, np.zeros(self.block_size - len(block), dtype=np.int16)])
+        return block
+
+    def feed(self):
+        block_seconds = self.block_size / SAMPLE_RATE
+        next_at = time.monotonic()
+        while self.running:
+            block = self.next_block()
+            # Like the microphone, a block arrives once it has been "recorded"
+            next_at += block_seconds
+            time.sleep(max(0.0, next_at - time.monotonic()))
+            if self.running:
+                self.callback(block.tobytes(), self.block_size, None, None)
+
+
+class NullAudioPlayer:
+    """Replaces engine.PcmPlayer: consumes audio at the speaker's pace without a device"""
+
+    def __init__(self, sample_rate=24000):
+        self.sample_rate = sample_rate
+
+    async def play(self, samples):
+        await asyncio.sleep(len(samples) / self.sample_rate)
+
+    async def play_stream(self, buffer_stream):
+        loop = asyncio.get_running_loop()
+        started = None
+        played = 0
+        async for buffer in buffer_stream:
+            if buffer is None:
+                break
+            if started is None:
+                started = loop.time()
+            played += len(buffer)
+            # Hold the next pull until this buffer would be half played
+            ahead = (played - len(buffer) / 2) / self.sample_rate - (loop.time() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+        if started is not None:
+            await asyncio.sleep(max(0.0, played / self.sample_rate - (loop.time() - started)))
@@ -0,0 +1,146 @@
+"""Load test for server.py: how many concurrent sessions one machine sustains
+
+    python -m benchmark.loadtest ws://127.0.0.1:8766 --sessions 1,2,4,8 --wavs recordings/
+
+Each simulated learner streams microphone audio in real time (silence, then
+a recorded answer whenever the server starts listening) and measures the
+time from the end of its answer to the first byte of the spoken reply.
+Without --wavs, answers are typed instead, which loads everything but the
+recognizer. For each concurrency level the report shows admissions,
+latency percentiles and the server's decoding load, and finally the most
+sessions per core that kept p95 latency under --slo-ms.
+"""
+import json
+import time
+import asyncio
+import argparse
+import urllib.request
+import numpy as np
+from urllib.parse import urlsplit
+
+from benchmark.fixtures import load_fixtures, SYNTHETIC_ANSWERS, SAMPLE_RATE
+
+BLOCK_SIZE = 1600  # Samples per microphone frame (100 ms), as the app captures them
+
+
+class SessionResult:
+    def __init__(self):
+        self.admitted = False
+        self.rejected = False
+        self.error = None
+        self.latencies = []
+
+
+async def run_session(url, fixtures, turns):
+    """One learner: answer `turns` times, then hang up"""
+    from websockets.asyncio.client import connect
+
+    result = SessionResult()
+    silence = np.zeros(BLOCK_SIZE, dtype=np.int16)
+    speaking = []          # Blocks of the answer still to send
+    answered_at = None     # When the last answer finished
+    answers = 0
+
+    try:
+        async with connect(url, max_size=2 ** 22) as connection:
+            async def send_audio():
+                nonlocal answered_at
+                next_at = time.perf_counter()
+                while True:
+                    block = speaking.pop(0) if speaking else silence
+                    next_at += BLOCK_SIZE / SAMPLE_RATE
+                    await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                    await connection.send(block.tobytes())
+                    if block is not silence and not speaking:
+                        answered_at = time.perf_counter()
+
+            sender = asyncio.create_task(send_audio()) if fixtures is not None else None
+            try:
+                async for message in connection:
+                    if isinstance(message, bytes):
+                        if answered_at is not None:
+                            result.latencies.append(time.perf_counter() - answered_at)
+                            answered_at = None
+                        continue
+
+                    event = json.loads(message)
+                    if event["type"] == "error" and event["message"].startswith("Busy"):
+                        result.rejected = True
+                        return result
+                    if event["type"] != "state":
+                        continue
+                    result.admitted = True
+                    if event["state"] != "LISTENING":
+                        continue
+                    if answers >= turns:
+                        return result
+
+                    if fixtures is not None:
+                        samples = fixtures[answers % len(fixtures)].samples
+                        speaking.extend(samples[i:i + BLOCK_SIZE] for i in range(0, len(samples), BLOCK_SIZE))
+                    else:
+                        await connection.send(json.dumps(
+                            {"type": "text", "text": SYNTHETIC_ANSWERS[answers % len(SYNTHETIC_ANSWERS)]}))
+                        answered_at = time.perf_counter()
+                    answers += 1
+            finally:
+                if sender is not None:
+                    sender.cancel()
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+def fetch_stats(url):
+    parts = urlsplit(url)
+    with urllib.request.urlopen(f"http://{parts.netloc}/stats", timeout=5) as response:
+        return json.load(response)
+
+
+async def run_level(url, sessions, fixtures, turns, stagger):
+    tasks = []
+    for _ in range(sessions):
+        tasks.append(asyncio.create_task(run_session(url, fixtures, turns)))
+        await asyncio.sleep(stagger)
+    return await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", nargs="?", default="ws://127.0.0.1:8766")
+    parser.add_argument("--sessions", default="1,2,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--turns", type=int, default=3, help="answers per session")
+    parser.add_argument("--wavs", help="directory of recorded answers to speak (16-bit WAV)")
+    parser.add_argument("--slo-ms", type=float, default=4000, help="p95 latency target")
+    parser.add_argument("--stagger", type=float, default=0.2, help="seconds between session starts")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.wavs) if args.wavs else None
+    best = 0
+    cpu_count = 1
+    print(f"{'sessions':>8}{'admitted':>10}{'rejected':>10}{'turns':>7}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'decode RTF':>12}{'lag ms':>8}")
+    for level in [int(n) for n in args.sessions.split(",")]:
+        results = asyncio.run(run_level(args.url, level, fixtures, args.turns, args.stagger))
+        stats = fetch_stats(args.url)
+        cpu_count = stats.get("cpu_count") or 1
+
+        latencies = [ms * 1000 for r in results for ms in r.latencies]
+        admitted = sum(r.admitted for r in results)
+        rejected = sum(r.rejected for r in results)
+        p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (float("nan"), float("nan"))
+        print(f"{level:>8}{admitted:>10}{rejected:>10}{len(latencies):>7}{p50:>9.0f}{p95:>9.0f}"
+              f"{stats['real_time_factor']:>12.3f}{stats['decode_lag_ms']:>8.0f}")
+        for r in results:
+            if r.error:
+                print(f"  session error: {r.error}")
+
+        if latencies and rejected == 0 and p95 <= args.slo_ms:
+            best = max(best, level)
+
+    print(f"Sessions per core within a {args.slo_ms:.0f} ms p95: {best / cpu_count:.1f} "
+          f"({best} sessions on {cpu_count} cores)")
+
+
+if __name__ == "__main__":
+    main()
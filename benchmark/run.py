@@ -0,0 +1,187 @@
+"""Headless end-to-end benchmark of the conversation loop
+
+Runs the real VocabularyApp offscreen against a local fake OpenAI server,
+with WAV fixtures played into the speech worker in place of the microphone
+and a null audio player in place of the speakers. Needs no network, display
+or audio hardware. Prints per-stage latency percentiles and throughput.
+
+    python -m benchmark.run --turns 20
+    python -m benchmark.run --wavs recordings/ --model vosk-model-small-en-us-0.15
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+from benchmark.fake_openai import FakeOpenAIServer, add_timing_arguments, fake_from_arguments
+from benchmark.fixtures import (load_fixtures, synthetic_fixtures, ScriptedRecognizer,
+                                ScriptedMicrophone, NullAudioPlayer)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10, help="answers to play before stopping")
+    parser.add_argument("--wavs", help="directory of 16-bit WAV answers (with optional .txt transcripts)")
+    parser.add_argument("--model", help="Vosk model directory; without it transcripts are scripted")
+    parser.add_argument("--local-grading", action="store_true", help="let clear answers skip the LLM")
+    parser.add_argument("--tts-cache", action="store_true",
+                        help="keep rendered speech between turns (the canned reply then hits the cache)")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="reuse LLM replies to repeated answers (synthetic answers repeat)")
+    parser.add_argument("--json", help="also write the summary to this file")
+    add_timing_arguments(parser)
+    return parser.parse_args()
+
+
+def configure_environment(args, work_dir, base_url):
+    """Settings main.py reads at import time"""
+    os.environ.update({
+        "QT_QPA_PLATFORM": "offscreen",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "benchmark",
+        "TTS_CACHE_DIR": os.path.join(work_dir, "tts_cache"),
+        "TTS_CACHE_MAX_MB": "200" if args.tts_cache else "0",
+        "RESPONSE_CACHE_FILE": os.path.join(work_dir, "response_cache.sqlite"),
+        "RESPONSE_CACHE_MAX_KB": "2048" if args.response_cache else "0",
+        "TRACE_FILE": os.path.join(work_dir, "turn_traces.jsonl"),
+        "SESSION_LOG_DIR": os.path.join(work_dir, "session_logs"),
+        "WORD_PROGRESS_FILE": os.path.join(work_dir, "word_progress.jsonl"),
+        "STARTUP_REPORT_FILE": os.path.join(work_dir, "startup_times.jsonl"),
+        "LOCAL_GRADING": "1" if args.local_grading else "0",
+        "BARGE_IN": "0",
+    })
+    if args.model:
+        os.environ["VOSK_MODEL_PATH"] = args.model
+
+
+class Harness:
+    """Plugs fixtures and a null player into the app's audio hooks and stops after N turns
+
+    Each time the engine starts listening, the next fixture is played into
+    the scripted microphone.
+    """
+
+    def __init__(self, main, fixtures, turns, scripted):
+        self.main = main
+        self.engine = main.engine
+        self.fixtures = fixtures
+        self.turns = turns
+        self.answered = 0
+        self.recognizer = ScriptedRecognizer() if scripted else None
+        self.microphone = None
+        self.session = None
+
+    def install(self, app):
+        self.session = app.engine
+        self.session.add_listener(self)
+        self.main.open_input_stream = self.open_input_stream
+        self.engine.create_audio_player = NullAudioPlayer
+        if self.recognizer is not None:
+            self.engine.load_speech_model = lambda: None
+            self.engine.create_recognizer = lambda speech_model: self.recognizer
+            self.engine.COMMAND_GRAMMAR = False  # The script has no command recognizer
+
+    def open_input_stream(self, callback):
+        self.microphone = ScriptedMicrophone(callback, self.engine.BLOCK_SIZE)
+        return self.microphone
+
+    # EngineEvents, called on the engine loop
+
+    def on_state(self, state, word):
+        if state != self.engine.LISTENING:
+            return
+        if self.answered >= self.turns:
+            # Every answer has been given and the last turn's trace is closed
+            self.session.close()
+            return
+
+        fixture = self.fixtures[self.answered % len(self.fixtures)]
+        self.answered += 1
+        if self.recognizer is not None:
+            self.recognizer.start(fixture)
+        self.microphone.play(fixture.samples)
+
+    def on_partial(self, text):
+        pass
+
+    def on_user_text(self, text):
+        pass
+
+    def on_reply_text(self, text):
+        pass
+
+    def on_error(self, message):
+        pass
+
+
+def summarize(records, wall_seconds, fake):
+    from tracing import STAGES
+    import numpy as np
+
+    summary = {"turns": len(records), "wall_seconds": round(wall_seconds, 2),
+               "turns_per_minute": round(len(records) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+               "requests": dict(fake.requests), "stages_ms": {}}
+    for name, _, _ in STAGES:
+        values = [r["stages_ms"][name] for r in records if name in r.get("stages_ms", {})]
+        if values:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary["stages_ms"][name] = {"count": len(values), "p50": round(float(p50), 1),
+                                          "p95": round(float(p95), 1), "p99": round(float(p99), 1),
+                                          "max": round(float(max(values)), 1)}
+    return summary
+
+
+def main():
+    args = parse_arguments()
+    fixtures = load_fixtures(args.wavs) if args.wavs else synthetic_fixtures()
+    if not fixtures:
+        sys.exit(f"No WAV files in {args.wavs}")
+    if args.model is None and any(not fixture.transcript for fixture in fixtures):
+        sys.exit("Without --model every WAV needs a .txt transcript next to it")
+
+    fake = fake_from_arguments(args)
+    server = FakeOpenAIServer(fake).start()
+    work_dir = tempfile.mkdtemp(prefix="vocab-bench-")
+    configure_environment(args, work_dir, server.base_url)
+
+    # Imported only now so it picks up the settings above
+    import main as app_module
+    from tracing import load_traces, report
+
+    harness = Harness(app_module, fixtures, args.turns, scripted=args.model is None)
+    app = app_module.VocabularyApp()
+    harness.install(app)
+
+    print(f"Benchmarking {args.turns} turns with {len(fixtures)} fixtures against {server.base_url}")
+    started = time.perf_counter()
+    app.start()
+    wall_seconds = time.perf_counter() - started
+
+    app_module.tracer.close()
+    app_module.engine.session_log.close()
+    print(f"Session log: {app_module.engine.session_log.stats()}")
+    print(f"Scheduler: {app_module.engine.scheduler_stats.stats()}")
+    app_module.runtime.stop()
+    server.stop()
+
+    trace_file = app_module.engine.TRACE_FILE
+    records = load_traces(trace_file) if os.path.exists(trace_file) else []
+    print(f"Startup: {app_module.startup.summary()}")
+    if records:
+        print(report(records))
+    summary = summarize(records, wall_seconds, fake)
+    print(f"Throughput: {summary['turns_per_minute']} turns/min over {summary['wall_seconds']} s "
+          f"({fake.requests['responses']} LLM and {fake.requests['speech']} TTS requests)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    # Skip interpreter teardown: collecting the offscreen Qt objects at exit can crash PySide6
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Terminal front end for the practice engine, no display needed
+
+    python cli.py              type your answers, hear the replies
+    python cli.py --mic        speak your answers instead
+    python cli.py --mute       text only, no audio out
+    python cli.py --fast       text only and unpaced, for scripted runs (answers on stdin)
+
+Say or type "new word" for another word and "goodbye" (or end the input) to quit.
+"""
+import sys
+import argparse
+import threading
+
+import engine
+from engine import ConversationEngine, EngineEvents, SilentPlayer, runtime, tracer
+
+STATE_LABELS = {
+    engine.WARMING_UP: "Warming up...",
+    engine.LISTENING: "Listening...",
+    engine.THINKING: "Thinking...",
+}
+
+
+class TerminalEvents(EngineEvents):
+    def __init__(self):
+        self.partial_shown = False
+
+    def on_state(self, state, word):
+        self.clear_partial()
+        if state == engine.PROMPTING:
+            print(f"\nWord: {word}")
+        elif state in STATE_LABELS:
+            print(STATE_LABELS[state])
+
+    def on_partial(self, text):
+        print(f"... {text}", end="\r", flush=True)
+        self.partial_shown = True
+
+    def on_user_text(self, text):
+        self.clear_partial()
+        print(f"You: {text}")
+
+    def on_reply_text(self, text):
+        print(f"Tutor: {text}")
+
+    def on_error(self, message):
+        print(f"Error: {message}")
+
+    def clear_partial(self):
+        if self.partial_shown:
+            print()
+            self.partial_shown = False
+
+
+def read_answers(session):
+    """Send each typed line to the engine; end of input closes the session"""
+    for line in sys.stdin:
+        if line.strip():
+            session.submit_text(line)
+    session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Practice vocabulary in the terminal")
+    parser.add_argument("--mic", action="store_true", help="answer by speaking into the microphone")
+    parser.add_argument("--mute", action="store_true", help="don't play any audio")
+    parser.add_argument("--fast", action="store_true", help="don't pace playback (implies --mute)")
+    args = parser.parse_args()
+
+    silent = args.mute or args.fast
+    session = ConversationEngine(TerminalEvents(), speech_input=args.mic, realtime=not args.fast,
+                                 player_factory=SilentPlayer if silent else None)
+
+    input_stream = None
+    if args.mic:
+        import sounddevice as sd
+        input_stream = sd.RawInputStream(samplerate=engine.SAMPLE_RATE, blocksize=engine.BLOCK_SIZE,
+                                         dtype='int16', channels=1, callback=session.audio_callback)
+        input_stream.start()
+    threading.Thread(target=read_answers, args=(session,), name="stdin", daemon=True).start()
+
+    try:
+        runtime.run(session.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if input_stream is not None:
+            input_stream.close()
+        engine.close_audio_player()
+        print(f"Response cache: {engine.response_cache.stats()}")
+        print(f"Scheduler: {engine.scheduler_stats.stats()}")
+        engine.session_log.close()
+        tracer.close()
+        runtime.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import json
+from collections import deque, namedtuple
+
+# Spoken phrases for each command; extend or override with a JSON file of the same shape
+DEFAULT_COMMANDS = {
+    "END_TURN": ["up to you", "upto you", "your turn", "next to you", "over to you"],
+    "CHANGE_WORD": ["give me a new word", "new word", "another word"],
+    "CLOSE": ["goodbye", "good bye"],
+}
+
+# A command found in a transcript; start and end are word indexes (end exclusive)
+CommandMatch = namedtuple("CommandMatch", ["command", "phrase", "start", "end"])
+
+
+def load_commands(path=None):
+    """Return the command table, with phrases from an optional JSON file added"""
+    commands = {name: list(phrases) for name, phrases in DEFAULT_COMMANDS.items()}
+    if path:
+        with open(path) as f:
+            for name, phrases in json.load(f).items():
+                commands.setdefault(name, []).extend(phrases)
+    return commands
+
+
+def command_grammar(commands):
+    """Vosk grammar that only knows the command phrases; other speech decodes as [unk]"""
+    phrases = sorted({phrase.lower() for phrases in commands.values() for phrase in phrases})
+    return json.dumps(phrases + ["[unk]"])
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over words that finds every command phrase in one pass"""
+
+    def __init__(self, commands):
+        # State 0 is the root; each state has word transitions, a failure link and outputs
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+
+        for command, phrases in commands.items():
+            for phrase in phrases:
+                words = phrase.lower().split()
+                if words:
+                    self.add_phrase(command, phrase, words)
+        self.build_failure_links()
+
+    def add_phrase(self, command, phrase, words):
+        state = 0
+        for word in words:
+            if word not in self.transitions[state]:
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.transitions[state][word] = len(self.transitions) - 1
+            state = self.transitions[state][word]
+        self.outputs[state].append((command, phrase, len(words)))
+
+    def build_failure_links(self):
+        pending = deque(self.transitions[0].values())
+        while pending:
+            state = pending.popleft()
+            for word, child in self.transitions[state].items():
+                pending.append(child)
+                fallback = self.fail[state]
+                while fallback and word not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.transitions[fallback].get(word, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def step(self, state, word):
+        """Advance the automaton by one word"""
+        while state and word not in self.transitions[state]:
+            state = self.fail[state]
+        return self.transitions[state].get(word, 0)
+
+    def matches_at(self, state, end):
+        """Matches ending at word index end, longest phrase first"""
+        return [CommandMatch(command, phrase, end - length, end)
+                for command, phrase, length in sorted(self.outputs[state], key=lambda o: -o[2])]
+
+    def search(self, text):
+        """Return the first command in text, or None"""
+        state = 0
+        for index, word in enumerate(text.lower().split()):
+            state = self.step(state, word)
+            if self.outputs[state]:
+                return self.matches_at(state, index + 1)[0]
+        return None
+
+
+class CommandSpotter:
+    """Runs a PhraseMatcher incrementally over partial hypotheses of one utterance
+
+    Partial results mostly grow by appending words, with the last few words
+    occasionally revised, so only the words after the common prefix with the
+    previous hypothesis are scanned. A command fires once it has been present
+    in stable_partials consecutive hypotheses.
+    """
+
+    def __init__(self, matcher, stable_partials=2):
+        self.matcher = matcher
+        self.stable_partials = stable_partials
+        self.reset()
+
+    def reset(self):
+        self.words = []
+        self.states = [0]  # Automaton state after each scanned word
+        self.candidate = None
+        self.seen_count = 0
+
+    def feed_partial(self, partial):
+        """Scan a new partial hypothesis; returns a CommandMatch once it is stable"""
+        words = partial.lower().split()
+
+        # Resume from the longest prefix shared with the previous hypothesis
+        common = 0
+        while common < min(len(words), len(self.words)) and words[common] == self.words[common]:
+            common += 1
+        del self.states[common + 1:]
+
+        for index in range(common, len(words)):
+            self.states.append(self.matcher.step(self.states[-1], words[index]))
+        self.words = words
+
+        match = None
+        for end in range(1, len(self.states)):
+            if self.matcher.outputs[self.states[end]]:
+                match = self.matcher.matches_at(self.states[end], end)[0]
+                break
+
+        if match is None:
+            self.candidate = None
+            self.seen_count = 0
+            return None
+
+        key = (match.command, match.start, match.end)
+        if key == self.candidate:
+            self.seen_count += 1
+        else:
+            self.candidate = key
+            self.seen_count = 1
+        return match if self.seen_count >= self.stable_partials else None
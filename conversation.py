@@ -0,0 +1,120 @@
+import re
+import inspect
+import threading
+
+# tiktoken gives exact counts but is optional; fall back to an estimate without it
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+SUMMARY_MAX_CHARS = 600
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and framing tokens added per message
+
+
+class TokenCounter:
+    """Counts tokens locally, exactly with tiktoken or approximately without it"""
+
+    def __init__(self, model="gpt-4o"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+
+    def count(self, text):
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+
+    def count_message(self, message):
+        return self.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summarize_locally(summary, messages):
+    """Fold messages into the summary by keeping the first sentence of each"""
+    lines = [summary] if summary else []
+    for message in messages:
+        first_sentence = re.split(r'(?<=[.!?])\s', message["content"].strip(), maxsplit=1)[0]
+        lines.append(f"{message['role']}: {first_sentence[:150]}")
+
+    # Keep the most recent part when the summary grows too long
+    return " ".join(lines)[-SUMMARY_MAX_CHARS:]
+
+
+class ConversationHistory:
+    """Conversation with a fixed seed prefix, a rolling summary and recent turns
+
+    The seed messages are always sent first and never change, so provider-side
+    prompt caching can reuse them. Once the prompt grows past the token budget,
+    everything but the most recent messages is folded into the summary.
+    """
+
+    def __init__(self, seed, budget_tokens=1200, keep_recent=4, summarize=None, model="gpt-4o"):
+        self.seed = list(seed)
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.summarize = summarize or summarize_locally
+        self.counter = TokenCounter(model)
+        self.lock = threading.Lock()
+
+        self.summary = ""
+        self.turns = []
+        self.turn_tokens = []
+        self.seed_tokens = sum(self.counter.count_message(m) for m in self.seed)
+        self.summary_tokens = 0
+
+        # Size of the most recent prompt returned by messages()
+        self.last_prompt_tokens = 0
+
+    def append(self, role, content):
+        message = {"role": role, "content": content}
+        with self.lock:
+            self.turns.append(message)
+            self.turn_tokens.append(self.counter.count_message(message))
+
+    def summary_message(self):
+        return {"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"}
+
+    def prompt_tokens(self):
+        with self.lock:
+            return self.seed_tokens + self.summary_tokens + sum(self.turn_tokens)
+
+    def messages(self):
+        """Messages to send: the seed, the summary if any, then recent turns"""
+        with self.lock:
+            messages = list(self.seed)
+            if self.summary:
+                messages.append(self.summary_message())
+            messages.extend(self.turns)
+            self.last_prompt_tokens = self.seed_tokens + self.summary_tokens + sum(self.turn_tokens)
+        return messages
+
+    async def compact(self):
+        """Fold older turns into the summary if the prompt is over budget"""
+        with self.lock:
+            total = self.seed_tokens + self.summary_tokens + sum(self.turn_tokens)
+            fold_count = len(self.turns) - self.keep_recent
+            if total <= self.budget_tokens or fold_count <= 0:
+                return False
+            folded = self.turns[:fold_count]
+            summary = self.summary
+
+        # Summarizing may call out to a model, so do it without holding the lock
+        try:
+            new_summary = self.summarize(summary, folded)
+            if inspect.isawaitable(new_summary):
+                new_summary = await new_summary
+        except Exception as e:
+            print(f"Summary error, using local summary: {e}")
+            new_summary = summarize_locally(summary, folded)
+
+        with self.lock:
+            self.summary = new_summary
+            self.summary_tokens = self.counter.count_message(self.summary_message())
+            del self.turns[:fold_count]
+            del self.turn_tokens[:fold_count]
+        print(f"Folded {fold_count} messages into the summary")
+        return True
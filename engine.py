@@ -0,0 +1,1258 @@
+"""Conversation engine: the vocabulary practice loop as an asyncio state machine
+
+Takes microphone audio (or typed text) in and gives speech and text out,
+without any UI. Front ends (the Qt bubble in main.py, the terminal in
+cli.py) subscribe to EngineEvents and feed audio with feed_audio().
+"""
+import re
+import os
+import sys
+import math
+import time
+import asyncio
+import threading
+import numpy as np
+from collections import deque
+from contextlib import AsyncExitStack
+from dotenv import load_dotenv
+
+from tts_cache import TTSCache
+from conversation import ConversationHistory
+from async_runtime import AsyncRuntime
+from vad import pcm_rms
+from commands import PhraseMatcher, load_commands, command_grammar
+from level_meter import LevelMeter
+from word_store import load_words
+from word_bank import WordBank
+from grader import LocalGrader, CORRECT, WRONG
+from tracing import Tracer
+from recognizer import Turn, TurnRecognizer, RecognizerPool
+from playback import PcmPlayer
+from audio_capture import CaptureRing
+from resilience import CircuitBreaker, Retrier, LatencyTracker, hedged
+from response_cache import ResponseCache, normalize
+from session_log import SessionLog
+from turn_scheduler import TurnScheduler, SchedulerStats, CancelToken, FOREGROUND, BACKGROUND
+
+load_dotenv()
+
+# Engine states, reported to front ends through EngineEvents.on_state
+WARMING_UP = "WARMING_UP"            # Loading the speech model and connecting
+PROMPTING = "PROMPTING"              # A new word was chosen; its prompt is being prepared
+PROMPT_PLAYING = "PROMPT_PLAYING"    # The prompt is audible
+LISTENING = "LISTENING"              # Waiting for the user's answer
+THINKING = "THINKING"                # The reply is being generated
+REPLY_PLAYING = "REPLY_PLAYING"      # The reply is audible
+CLOSED = "CLOSED"
+
+# Shared asyncio runtime; its pooled client (runtime.client) serves every OpenAI call
+# and is created in the background
+runtime = AsyncRuntime()
+
+# Voice instructions for text-to-speech
+instructions = """Delivery: Exaggerated and theatrical, with dramatic pauses, sudden outbursts, and gleeful cackling.
+Voice: High-energy, eccentric, and slightly unhinged, with a manic enthusiasm that rises and falls unpredictably.
+Tone: Excited, chaotic, and grandiose, as if reveling in the brilliance of a mad experiment.
+Pronunciation: Sharp and expressive, with elongated vowels, sudden inflections, and an emphasis on big words to sound more diabolical."""
+
+# Text-to-speech settings
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "coral"
+WORD_PROMPT = "Explain the meaning of {word}"
+
+# Rendered speech cache, keyed on everything that changes the audio
+tts_cache = TTSCache(os.getenv("TTS_CACHE_DIR", ".tts_cache"),
+                     int(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+# Replies to the same input in the same conversation are reused, with their rendered speech
+REPLY_MODEL = "gpt-4o"
+response_cache = ResponseCache(os.getenv("RESPONSE_CACHE_FILE", ".response_cache.sqlite"),
+                               int(os.getenv("RESPONSE_CACHE_MAX_KB", "2048")) * 1024,
+                               float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "168")) * 3600)
+
+# Spaced-repetition progress, appended to this file as words are answered; on the
+# server, each learner who sends an id has a file of their own in WORD_PROGRESS_DIR
+WORD_PROGRESS_FILE = os.getenv("WORD_PROGRESS_FILE", "word_progress.jsonl")
+WORD_PROGRESS_DIR = os.getenv("WORD_PROGRESS_DIR", "word_progress")
+LEARNER_ID = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+
+# Local grading of first answers against the meaning column; unclear scores go to the LLM
+LOCAL_GRADING = os.getenv("LOCAL_GRADING", "1") == "1"
+GRADE_CORRECT_THRESHOLD = float(os.getenv("GRADE_CORRECT_THRESHOLD", "0.45"))
+GRADE_WRONG_THRESHOLD = float(os.getenv("GRADE_WRONG_THRESHOLD", "0"))  # 0: only "I don't know" is wrong
+
+# Per-turn stage timings, written in the background; summarise with `python tracing.py`
+TRACE_FILE = os.getenv("TRACE_FILE", "turn_traces.jsonl")
+tracer = Tracer(TRACE_FILE, enabled=os.getenv("TRACING", "1") == "1")
+
+# Setup audio parameters
+SAMPLE_RATE = 16000
+
+# Every session's words, answers and replies, with the audio of spoken answers, for quality review;
+# read them back with `python session_log.py`. SESSION_LOG_AUDIO_MAX_MB=0 keeps all audio.
+session_log = SessionLog(os.getenv("SESSION_LOG_DIR", "session_logs"),
+                         enabled=os.getenv("SESSION_LOG", "1") == "1",
+                         audio=os.getenv("SESSION_LOG_AUDIO", "1") == "1",
+                         sample_rate=SAMPLE_RATE,
+                         segment_seconds=int(os.getenv("SESSION_LOG_SEGMENT_SECONDS", "60")),
+                         max_audio_bytes=int(os.getenv("SESSION_LOG_AUDIO_MAX_MB", "500")) * 1024 * 1024)
+
+# Microphone capture: audio reaches the recognizer in blocks of CAPTURE_BLOCK_MS (whole 20 ms
+# VAD frames), and at most CAPTURE_BUFFER_MS of undecoded audio is kept before the oldest is dropped
+CAPTURE_BLOCK_MS = max(20, int(os.getenv("CAPTURE_BLOCK_MS", "100")) // 20 * 20)
+BLOCK_SIZE = SAMPLE_RATE * CAPTURE_BLOCK_MS // 1000
+CAPTURE_BUFFER_MS = int(os.getenv("CAPTURE_BUFFER_MS", "10000"))
+MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "vosk-model-small-en-us-0.15")  # Adjust path as needed
+
+# End-of-turn detection: trailing silence ends the turn, spoken phrases still work too
+VAD_TRAILING_SILENCE_MS = int(os.getenv("VAD_TRAILING_SILENCE_MS", "1500"))
+VAD_MAX_UTTERANCE_MS = int(os.getenv("VAD_MAX_UTTERANCE_MS", "30000"))
+
+# Barge-in: keep the microphone open while speaking and stop playback when the user talks
+BARGE_IN = os.getenv("BARGE_IN", "0") == "1"
+BARGE_IN_MIN_SPEECH_MS = int(os.getenv("BARGE_IN_MIN_SPEECH_MS", "300"))
+BARGE_IN_ECHO_RATIO = float(os.getenv("BARGE_IN_ECHO_RATIO", "0.5"))
+
+# Spoken command table, compiled once; COMMANDS_FILE can add phrases from JSON
+command_table = load_commands(os.getenv("COMMANDS_FILE"))
+command_matcher = PhraseMatcher(command_table)
+COMMAND_STABLE_PARTIALS = 2  # Partial results a command must survive before it fires
+
+# A second recognizer limited to the command phrases spots commands quickly and with a confidence
+COMMAND_GRAMMAR = os.getenv("COMMAND_GRAMMAR", "1") == "1"
+COMMAND_MIN_CONFIDENCE = float(os.getenv("COMMAND_MIN_CONFIDENCE", "0.8"))
+
+# Speculative replies: the LLM request starts on a guess of the answer when the hand-over phrase
+# is first heard, or once a pause has lasted SPECULATE_AFTER_SILENCE_MS (by default half the
+# trailing silence that ends a turn; 0 turns pause guesses off), and is used if the final
+# transcript matches. A guess the user talks on from is cancelled after its first tokens and
+# counted as wasted; counts of used and wasted guesses are printed on exit.
+SPECULATIVE_REPLIES = os.getenv("SPECULATIVE_REPLIES", "1") == "1"
+SPECULATE_AFTER_SILENCE_MS = int(os.getenv("SPECULATE_AFTER_SILENCE_MS", str(VAD_TRAILING_SILENCE_MS // 2)))
+scheduler_stats = SchedulerStats()
+
+# Streaming reply settings
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+MIN_SENTENCE_CHARS = 20  # Merge very short sentences so TTS isn't called for a lone "Yes."
+TTS_LOOKAHEAD = 2        # Sentences synthesized ahead of the one currently playing
+TTS_SAMPLE_RATE = 24000
+TTS_MAX_AHEAD = 1.0      # Seconds of audio handed to the player ahead of playback
+
+# Speaker output: device name or index (default device if unset), and audio buffered before playback starts
+AUDIO_OUTPUT_DEVICE = os.getenv("AUDIO_OUTPUT_DEVICE") or None
+if AUDIO_OUTPUT_DEVICE is not None and AUDIO_OUTPUT_DEVICE.isdigit():
+    AUDIO_OUTPUT_DEVICE = int(AUDIO_OUTPUT_DEVICE)
+PLAYBACK_PREBUFFER_MS = int(os.getenv("PLAYBACK_PREBUFFER_MS", "150"))
+
+# Conversation history limits
+HISTORY_BUDGET_TOKENS = int(os.getenv("HISTORY_BUDGET_TOKENS", "1200"))
+HISTORY_KEEP_RECENT = 4  # Most recent messages always sent verbatim
+
+# Next-word prefetch limits
+PREFETCH_TIMEOUT = 15                     # Seconds before a prefetch gives up
+PREFETCH_MAX_BYTES = 24000 * 2 * 30       # At most ~30 seconds of 24 kHz PCM
+
+ERROR_RECOVERY_DELAY = 3  # Seconds an error stays on screen before a new word is picked
+
+# OpenAI calls: per-attempt deadlines, attempts per call, and circuit breakers that stop
+# calling a failing service for a while. Streams are only retried until their first byte.
+LLM_FIRST_TOKEN_TIMEOUT = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "10"))
+LLM_REPLY_TIMEOUT = float(os.getenv("LLM_REPLY_TIMEOUT", "60"))      # Whole streamed reply
+LLM_FIRST_TOKEN_DEADLINE = float(os.getenv("LLM_FIRST_TOKEN_DEADLINE", "15"))  # All attempts together
+TTS_FIRST_BYTE_TIMEOUT = float(os.getenv("TTS_FIRST_BYTE_TIMEOUT", "8"))
+TTS_RENDER_TIMEOUT = float(os.getenv("TTS_RENDER_TIMEOUT", "20"))    # A whole prompt
+OPENAI_ATTEMPTS = int(os.getenv("OPENAI_ATTEMPTS", "3"))
+llm_calls = Retrier(CircuitBreaker("LLM"), attempts=OPENAI_ATTEMPTS, timeout=LLM_FIRST_TOKEN_TIMEOUT)
+tts_calls = Retrier(CircuitBreaker("TTS"), attempts=OPENAI_ATTEMPTS, timeout=TTS_FIRST_BYTE_TIMEOUT)
+
+# Word prompts are short, so a second request is sent if the first is slower than the usual p95
+prompt_latency = LatencyTracker(default=float(os.getenv("TTS_HEDGE_DELAY", "1.5")))
+TTS_HEDGE_PERCENTILE = 95
+
+# Spoken instead of the reply when the LLM can't be reached; the details go to the log
+LLM_FALLBACK_REPLY = "Sorry, I couldn't come up with a reply just now. Could you say that again?"
+
+# Resources shared by every engine in the process, loaded once on first use
+model = None
+grader = None
+resources_lock = threading.Lock()
+
+# The word list and progress, loaded off the main thread: a large list takes seconds to index
+word_store = None
+word_bank = None
+words_lock = threading.Lock()
+
+def load_word_bank():
+    """Load the word list and replay the progress log once per process; returns the bank"""
+    global word_store, word_bank
+    with words_lock:
+        if word_bank is None:
+            store = load_words('words_list.csv')
+            store.build_index()
+            word_store = store
+            word_bank = WordBank(store, WORD_PROGRESS_FILE)
+    return word_bank
+
+# Banks of learners with a session open: learner id -> [bank, open sessions]
+learner_banks = {}
+
+def open_word_bank(learner=None):
+    """A learner's word bank; None is the local user's, "" a guest's kept only in memory
+
+    Sessions of the same learner share one bank, so one file has one writer.
+    """
+    if learner is None:
+        return load_word_bank()
+    load_word_bank()
+    if not learner:
+        return WordBank(word_store)
+    with words_lock:
+        entry = learner_banks.get(learner)
+        if entry is None:
+            os.makedirs(WORD_PROGRESS_DIR, exist_ok=True)
+            path = os.path.join(WORD_PROGRESS_DIR, f"{learner}.jsonl")
+            entry = learner_banks[learner] = [WordBank(word_store, path), 0]
+        entry[1] += 1
+        return entry[0]
+
+def close_word_bank(learner):
+    """Forget a learner's bank once their last session has closed"""
+    if not learner:
+        return
+    with words_lock:
+        entry = learner_banks[learner]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del learner_banks[learner]
+
+
+class SpeechModelError(Exception):
+    """Raised when the Vosk model can't be loaded, e.g. because it hasn't been downloaded"""
+
+
+def load_speech_model():
+    import vosk
+    try:
+        return vosk.Model(MODEL_PATH)
+    except Exception as e:
+        raise SpeechModelError(f"{e} ({MODEL_PATH})") from e
+
+def create_recognizer(speech_model):
+    import vosk
+    return vosk.KaldiRecognizer(speech_model, SAMPLE_RATE)
+
+# Recognizers are reused from session to session; this many are kept idle
+recognizers = RecognizerPool(lambda: create_recognizer(model),
+                             max_idle=int(os.getenv("RECOGNIZER_POOL_MAX_IDLE", "8")))
+
+def create_command_recognizer(speech_model):
+    import vosk
+    rec = vosk.KaldiRecognizer(speech_model, SAMPLE_RATE, command_grammar(command_table))
+    rec.SetWords(True)  # Per-word confidences
+    return rec
+
+command_recognizers = RecognizerPool(lambda: create_command_recognizer(model),
+                                     max_idle=recognizers.max_idle)
+
+def build_grader():
+    if LOCAL_GRADING:
+        return LocalGrader(word_store.meanings,
+                           correct_threshold=GRADE_CORRECT_THRESHOLD,
+                           wrong_threshold=GRADE_WRONG_THRESHOLD)
+    return None
+
+def prepare_shared_resources(speech_input=True, startup=None):
+    """Load the words, speech model and grader once per process and wait for the client"""
+    global model, grader
+    load_word_bank()
+    if startup is not None:
+        startup.mark("words_loaded")
+    with resources_lock:
+        if speech_input and model is None:
+            model = load_speech_model()
+            if startup is not None:
+                startup.mark("speech_model_loaded")
+        if grader is None:
+            grader = build_grader()
+            if startup is not None:
+                startup.mark("grader_built")
+    runtime.client  # Blocks until the OpenAI client exists
+    if startup is not None:
+        startup.mark("client_ready")
+
+# One player for the whole process; its output stream stays open between utterances
+audio_player = None
+
+def create_audio_player():
+    global audio_player
+    if audio_player is None:
+        audio_player = PcmPlayer(TTS_SAMPLE_RATE, device=AUDIO_OUTPUT_DEVICE,
+                                 prebuffer_ms=PLAYBACK_PREBUFFER_MS)
+    return audio_player
+
+def close_audio_player():
+    if audio_player is not None:
+        print(f"Playback: {audio_player.stats()}")
+        audio_player.close()
+
+
+class SilentPlayer:
+    """Player that discards audio at once, for text-only sessions and fast test runs"""
+
+    async def play(self, samples):
+        pass
+
+    async def play_stream(self, buffer_stream):
+        async for _ in buffer_stream:
+            pass
+
+
+# A stored meaning as the end of "<word> means ...": many already start with the word
+def meaning_text(word, meaning):
+    meaning = meaning.strip().rstrip(" .;")
+    return re.sub(rf"^{re.escape(word)}\w*'?\s+(?:means|refers to|refer to|is|are)\s+", "", meaning, flags=re.IGNORECASE)
+
+# The model opens its verdict on a first answer with one of these tags, which is never spoken
+VERDICTS = {"RIGHT": True, "WRONG": False, "PARTLY": None}
+VERDICT_TAG = re.compile(r"\s*\[([A-Za-z]+)\]\s*")
+UNJUDGED = "unjudged"
+
+# Whether the start of a streamed reply is long enough to tell if it opens with a tag
+def verdict_read(head):
+    opened = head.lstrip()
+    return bool(opened) and (opened[0] != "[" or "]" in opened or len(opened) > 12)
+
+# The verdict a reply opens with (True, False, or None for partly right) and the rest of it
+def split_verdict(text):
+    match = VERDICT_TAG.match(text)
+    if match is None or match.group(1).upper() not in VERDICTS:
+        return UNJUDGED, text
+    return VERDICTS[match.group(1).upper()], text[match.end():]
+
+
+# Fold older messages into the running summary with a small model
+async def summarize_with_llm(summary, messages):
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    response = await llm_calls.call(lambda: runtime.client.responses.create(
+        model="gpt-4o-mini",
+        instructions="Update the summary of this vocabulary practice conversation in at most three sentences. "
+                     "Keep what the learner got right or wrong.",
+        input=f"Current summary: {summary or '(none)'}\n\nNew messages:\n{transcript}"
+    ), timeout=LLM_REPLY_TIMEOUT)
+    return response.output_text.strip()
+
+# Split complete sentences off the front of streamed text
+def split_sentences(text):
+    parts = SENTENCE_BOUNDARY.split(text)
+    sentences = []
+    current = ""
+    for part in parts[:-1]:
+        current = f"{current} {part}" if current else part
+        if len(current) >= MIN_SENTENCE_CHARS:
+            sentences.append(current.strip())
+            current = ""
+    remainder = f"{current} {parts[-1]}" if current else parts[-1]
+    return sentences, remainder
+
+# Open a streaming PCM speech response for the given text
+def speech_stream(text):
+    return runtime.client.audio.speech.with_streaming_response.create(
+        model=TTS_MODEL,
+        voice=TTS_VOICE,
+        input=text,
+        instructions=instructions,
+        response_format="pcm",
+    )
+
+# Text deltas of a streamed Responses API reply
+async def reply_deltas(stream):
+    async for event in stream:
+        if event.type == "response.output_text.delta":
+            yield event.delta
+
+# Start a streamed reply: returns (stream, delta iterator, first delta or None),
+# so the request can be retried until text actually starts arriving
+async def open_reply_stream(messages):
+    stream = await runtime.client.responses.create(
+        model=REPLY_MODEL,
+        input=messages,
+        stream=True
+    )
+    deltas = reply_deltas(stream)
+    try:
+        first = await anext(deltas, None)
+    except BaseException:
+        await stream.close()
+        raise
+    return stream, deltas, first
+
+async def close_reply_stream(opened):
+    await opened[0].close()
+
+# Start streaming speech for text: returns (exit stack, chunk iterator, first chunk),
+# so a request can be retried until audio actually starts arriving
+async def open_speech(text):
+    stack = AsyncExitStack()
+    try:
+        response = await stack.enter_async_context(speech_stream(text))
+        chunks = response.iter_bytes(4096)
+        first = await anext(chunks, b"")
+    except BaseException:
+        await stack.aclose()
+        raise
+    return stack, chunks, first
+
+def speech_cache_key(text):
+    return TTSCache.make_key(text, TTS_VOICE, TTS_MODEL, instructions)
+
+# Download all of the speech for text; None if it is longer than max_bytes
+async def download_speech(text, max_bytes=None):
+    started = time.perf_counter()
+    async with speech_stream(text) as response:
+        rendered = []
+        size = 0
+        async for chunk in response.iter_bytes(4096):
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                return None
+            rendered.append(chunk)
+    prompt_latency.add(time.perf_counter() - started)
+    return b"".join(rendered)
+
+# Render PCM for text, reusing cached audio when available. With hedge, for a prompt the
+# user is waiting on, a request slower than the usual p95 is duplicated and the first to
+# finish wins; background renders never pay for a second request.
+async def render_speech(text, max_bytes=None, hedge=False):
+    key = speech_cache_key(text)
+    audio = tts_cache.get(key)
+    if audio is None:
+        def render():
+            return tts_calls.call(lambda: download_speech(text, max_bytes), timeout=TTS_RENDER_TIMEOUT)
+        if hedge:
+            audio = await hedged(render, delay=prompt_latency.percentile(TTS_HEDGE_PERCENTILE))
+        else:
+            audio = await render()
+        if audio is not None:
+            tts_cache.put(key, audio)
+    return audio
+
+# Warm the speech cache with the prompt for every word in the list
+async def prerender_words(words, concurrency=4):
+    semaphore = asyncio.Semaphore(concurrency)
+    rendered = 0
+
+    async def render(word):
+        nonlocal rendered
+        text = WORD_PROMPT.format(word=word)
+        if tts_cache.contains(speech_cache_key(text)):
+            return
+        async with semaphore:
+            try:
+                await render_speech(text)
+                rendered += 1
+                print(f"Pre-rendered: {word}")
+            except Exception as e:
+                print(f"Error pre-rendering {word}: {e}")
+
+    await asyncio.gather(*(render(word) for word in words))
+    print(f"Pre-render complete: {rendered} new, {tts_cache.total_bytes // 1024} KB cached")
+
+# Render the prompt for a word, giving up on unusually long audio
+async def fetch_prompt(word):
+    return await render_speech(WORD_PROMPT.format(word=word), max_bytes=PREFETCH_MAX_BYTES)
+
+
+class EngineEvents:
+    """What a front end hears from the engine; every method is optional
+
+    Called on the engine's event loop, so implementations should return
+    quickly and hand work to their own thread if they need to.
+    """
+
+    def on_state(self, state, word):
+        pass
+
+    def on_partial(self, text):
+        """Partial transcript of what the user is saying"""
+
+    def on_user_text(self, text):
+        """The user's finished answer"""
+
+    def on_reply_text(self, text):
+        """A sentence of the reply, as it is handed to speech synthesis"""
+
+    def on_error(self, message):
+        pass
+
+
+class ConversationEngine:
+    """One practice session: pick a word, prompt, listen, reply, repeat
+
+    run() drives the session on the shared runtime loop. Audio comes in
+    through feed_audio() (or audio_callback, for a sounddevice stream) and
+    typed answers through submit_text(); both are safe to call from any
+    thread. With speech_input=False no speech model is needed.
+
+    decode_pool, if given, is an object whose `async run(fn, block)` decodes
+    off the loop (see server.DecodePool); otherwise the default executor is
+    used. Audio waits to be decoded in a CaptureRing of BLOCK_SIZE blocks,
+    CAPTURE_BUFFER_MS long, or max_audio_blocks long if that is given: when
+    it is full, push_audio() waits for room and feed_audio() drops the
+    oldest block.
+
+    learner picks whose word progress is used (see open_word_bank): None,
+    the default, is the local user's.
+    """
+
+    def __init__(self, events=None, barge_in=BARGE_IN, speech_input=True, realtime=True,
+                 player_factory=None, startup=None, decode_pool=None, max_audio_blocks=0, learner=None):
+        self.listeners = [events] if events is not None else []
+        self.barge_in = barge_in
+        self.speech_input = speech_input
+        self.realtime = realtime  # Pace playback to the speaker; off for fast test runs
+        self.player_factory = player_factory
+        self.startup = startup
+        self.decode_pool = decode_pool
+        self.learner = learner
+        self.word_bank = None
+        self.opening_bank = None
+        self.loop = runtime.loop
+        slots = max_audio_blocks + 2 if max_audio_blocks else CAPTURE_BUFFER_MS // CAPTURE_BLOCK_MS
+        self.audio = CaptureRing(self.loop, BLOCK_SIZE, slots, limit=max_audio_blocks)
+        self.input_overflows = 0  # Blocks the sound card lost before we got them
+        self.session = session_log.open_session()
+        self.answer_start = 0  # Logged audio position where the current answer began
+
+        self.state = None
+        self.word = None
+        self.history = None
+        self.recognizer = None
+        self.capture = 0  # Bumped for every new turn; audio and decodes from older turns are dropped
+        self.playback_level = 0.0  # RMS of the audio currently being played, for the echo guard
+
+        # Microphone and playback levels for a waveform, read by the UI without locks
+        self.input_meter = LevelMeter()
+        self.output_meter = LevelMeter()
+
+        self.inputs = None  # Finished turns and typed answers, created on the loop
+        self.scheduler = TurnScheduler(scheduler_stats)
+        self.speech_task = None
+        self.reply_task = None
+        self.turn_token = None
+        self.heard_at = None  # When the first words of the current answer were recognized
+        self.reopen_requested = False  # Reset the recognizer for the next answer ahead of time
+        self.recognizer_fresh = False
+        self.interrupted = False
+        # Copies of the last blocks heard over speech, so a barge-in is decoded from its start
+        self.barge_in_audio = deque(maxlen=math.ceil(BARGE_IN_MIN_SPEECH_MS / CAPTURE_BLOCK_MS))
+        self.prefetch_task = None
+        self.turn_trace = None
+
+    def add_listener(self, events):
+        self.listeners.append(events)
+
+    def emit(self, name, *args):
+        for listener in self.listeners:
+            getattr(listener, name)(*args)
+
+    def set_state(self, state):
+        self.state = state
+        self.emit("on_state", state, self.word)
+
+    def create_player(self):
+        factory = self.player_factory or create_audio_player
+        return factory()
+
+    # Input, from any thread
+
+    @property
+    def dropped_blocks(self):
+        return self.audio.dropped
+
+    def feed_audio(self, data):
+        """Queue 16 kHz mono int16 microphone audio, of any length"""
+        self.audio.write(data)
+
+    def audio_callback(self, indata, frames, time, status):
+        if status and status.input_overflow:
+            self.input_overflows += 1
+        elif status:
+            print("Audio status:", status, file=sys.stderr)
+        self.feed_audio(indata)
+
+    def submit_text(self, text):
+        """Answer (or give a command) by text instead of speech"""
+        self.loop.call_soon_threadsafe(self.submit_text_now, text)
+
+    def submit_text_now(self, text):
+        now = time.perf_counter()
+        match = command_matcher.search(text)
+        if match is not None and match.command != "END_TURN":
+            self.put_turn(Turn(match.command, match.phrase, now, now))
+        else:
+            self.put_turn(Turn("ANSWER", text.strip(), now, now))
+
+    def create_queues(self):
+        if self.inputs is None:
+            self.inputs = asyncio.Queue()
+
+    async def push_audio(self, data):
+        """Queue audio from the loop, waiting while the backlog is full"""
+        await self.audio.push(data)
+
+    def put_turn(self, turn):
+        self.create_queues()
+        self.inputs.put_nowait(turn)
+
+    def close(self):
+        """End the session; run() returns shortly after"""
+        self.loop.call_soon_threadsafe(self.put_turn, Turn("CLOSE", "", None, None))
+
+    # The session
+
+    async def run(self):
+        self.create_queues()
+        audio_task = asyncio.create_task(self.audio_loop())
+        try:
+            await self.warm_up()
+            turn = Turn("CHANGE_WORD", "", None, None)  # Start with a new word
+            while turn.kind != "CLOSE":
+                try:
+                    await self.handle(turn)
+                except Exception as e:
+                    print(f"Error: {e}")
+                    self.session.record("error", self.word, f"{type(e).__name__}: {e}")
+                    self.finish_turn("error")
+                    self.emit("on_error", str(e))
+                    # Leave the error up for a moment, then start over with a new word
+                    await asyncio.sleep(ERROR_RECOVERY_DELAY)
+                    turn = Turn("CHANGE_WORD", "", None, None)
+                    continue
+                turn = await self.inputs.get()
+        finally:
+            audio_task.cancel()
+            # Wait for a decode in flight before the recognizer goes back to the pool
+            await asyncio.gather(audio_task, return_exceptions=True)
+            if self.recognizer is not None:
+                recognizers.release(self.recognizer.rec)
+                if self.recognizer.command_rec is not None:
+                    command_recognizers.release(self.recognizer.command_rec)
+                self.recognizer = None
+            self.scheduler.cancel_all()
+            self.prefetch_task = None
+            self.session.close()
+            if self.opening_bank is not None:
+                self.opening_bank.add_done_callback(self.release_word_bank)
+            self.set_state(CLOSED)
+
+    async def handle(self, turn):
+        if turn.confidence is not None:
+            print(f"Command spotted: {turn.kind} (confidence {turn.confidence:.2f})")
+        if turn.kind != "ANSWER":
+            self.session.record("command", self.word, turn.kind, confidence=turn.confidence)
+        if turn.kind != "ANSWER" or not turn.text:
+            self.scheduler.drop_speculation(turn.kind.lower())
+        if turn.kind == "CHANGE_WORD":
+            await self.new_word()
+        elif turn.kind == "ANSWER" and turn.text:
+            await self.respond(turn)
+        else:
+            self.listen()  # Nothing was said; keep listening
+
+    async def warm_up(self):
+        self.set_state(WARMING_UP)
+        # Fetch the first word while the model loads
+        self.start_prefetch()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, prepare_shared_resources, self.speech_input, self.startup)
+        if self.speech_input:
+            command_rec = None
+            if COMMAND_GRAMMAR:
+                command_rec = await loop.run_in_executor(None, command_recognizers.acquire)
+            self.recognizer = TurnRecognizer(
+                await loop.run_in_executor(None, recognizers.acquire), command_matcher, SAMPLE_RATE,
+                trailing_silence_ms=VAD_TRAILING_SILENCE_MS,
+                max_utterance_ms=VAD_MAX_UTTERANCE_MS,
+                stable_partials=COMMAND_STABLE_PARTIALS,
+                barge_in_min_speech_ms=BARGE_IN_MIN_SPEECH_MS,
+                barge_in_echo_ratio=BARGE_IN_ECHO_RATIO,
+                command_rec=command_rec,
+                command_min_confidence=COMMAND_MIN_CONFIDENCE,
+                speculate_after_silence_ms=SPECULATE_AFTER_SILENCE_MS if SPECULATIVE_REPLIES else 0)
+
+    async def pick_word(self, exclude=None):
+        """This learner's most overdue word (or a new one), avoiding the one being practiced
+
+        Waits for the word list and the learner's progress if they are still loading.
+        """
+        if self.word_bank is None:
+            if self.opening_bank is None:
+                self.opening_bank = self.loop.run_in_executor(None, open_word_bank, self.learner)
+            # Shielded so a cancelled prefetch doesn't lose the bank it opened
+            self.word_bank = await asyncio.shield(self.opening_bank)
+        return self.word_bank.next_word(exclude)
+
+    def release_word_bank(self, opening):
+        """Release the learner's bank once the session is over and the bank has opened"""
+        if not opening.cancelled() and opening.exception() is None:
+            close_word_bank(self.learner)
+
+    async def new_word(self):
+        # The next word may already be on its way; use it as soon as it lands
+        prefetched = await self.take_prefetched()
+        prompt_audio = None
+        if prefetched is not None:
+            self.word, prompt_audio = prefetched
+        else:
+            self.word = await self.pick_word(exclude=self.word)
+        self.word_bank.use(self.word)
+
+        # Reset conversation history for new word
+        self.history = ConversationHistory([
+            {"role": "system", "content": "You are a helpful, friendly AI assistant. Begin your reply to the "
+                                          "learner's first explanation of the word with [RIGHT], [WRONG] or "
+                                          "[PARTLY], then reply as usual."},
+            {"role": "user", "content": "I want to practice some word meanings of English language which people use in their day to day life"},
+            {"role": "assistant", "content": f"Great! You can start with {self.word}. Explain the meaning of this word if you know, otherwise I will tell you."}
+        ], budget_tokens=HISTORY_BUDGET_TOKENS, keep_recent=HISTORY_KEEP_RECENT, summarize=summarize_with_llm)
+
+        self.session.record("word", self.word, WORD_PROMPT.format(word=self.word))
+        self.set_state(PROMPTING)
+        self.turn_token = CancelToken("prompt")
+        self.reopen_requested = not self.barge_in
+        if await self.speak(self.play_prompt(WORD_PROMPT.format(word=self.word), prompt_audio)):
+            self.listen()
+
+    async def respond(self, turn):
+        # Let the previous reply finish folding the history before this turn changes it
+        if self.reply_task is not None:
+            await asyncio.gather(self.reply_task, return_exceptions=True)
+
+        trace = tracer.start_turn(turn.speech_end)
+        trace.mark("speech_end", turn.speech_end)
+        # Trailing silence the endpointer waited out; commands and typed answers end at once
+        trace.mark("endpoint", turn.endpoint if turn.endpoint is not None else turn.speech_end)
+        trace.mark("asr_final", turn.asr_final)
+        if self.heard_at is not None and turn.speech_end is not None and self.heard_at <= turn.speech_end:
+            trace.mark("speech_start", self.heard_at)
+        trace.tags["word"] = self.word
+        if turn.confidence is not None:
+            trace.tags["end_turn_confidence"] = round(turn.confidence, 3)
+        self.turn_trace = trace
+        self.turn_token = CancelToken("turn")
+        # The recognizer isn't needed until this reply has played; get it ready meanwhile
+        self.reopen_requested = not self.barge_in
+
+        self.emit("on_user_text", turn.text)
+        self.session.record("answer", self.word, turn.text, confidence=turn.confidence,
+                            audio=(self.answer_start, self.session.position - self.answer_start))
+        self.set_state(THINKING)
+
+        # Generate the reply, speaking each sentence as soon as it is ready
+        sentences = asyncio.Queue()
+        first_answer = not self.history.turns
+        local_reply = self.grade_locally(turn.text)
+        cache_key = cached = speculation = None
+        if local_reply is None:
+            cache_key = ResponseCache.make_key(REPLY_MODEL, self.history.messages(), turn.text)
+            speculation = self.scheduler.claim(turn.text)
+            if speculation is None:
+                cached = response_cache.get(cache_key)
+        else:
+            self.scheduler.drop_speculation("graded locally")
+        trace.tags["reply"] = ("local" if local_reply is not None else "cache" if cached is not None
+                               else "speculative" if speculation is not None else "gpt")
+        trace.mark("reply_start")
+        # Starting the reply preempts the next-word prefetch, keeping the network free for it
+        if local_reply is not None:
+            reply = self.local_reply(turn.text, local_reply, sentences)
+        elif cached is not None:
+            reply = self.cached_reply(turn.text, cached, sentences, first_answer)
+        else:
+            reply = self.ask_gpt4o(turn.text, sentences, trace, cache_key, speculation, first_answer)
+        self.reply_task = self.scheduler.start("reply", reply, FOREGROUND, self.turn_token)
+
+        if await self.speak(self.speak_sentences(sentences, trace)):
+            self.listen()
+        else:
+            self.turn_token.cancel("barge_in")
+
+    def grade_locally(self, user_input):
+        """Reply instantly to a clearly right or wrong first answer; None means ask GPT-4o"""
+        if not self.may_grade_locally():
+            return None
+        index = word_store.index_of(self.word)
+
+        verdict, score = grader.grade(index, user_input, self.word)
+        print(f"Local grade: {verdict} ({score:.2f})")
+        if verdict in (CORRECT, WRONG):
+            self.word_bank.record(self.word, verdict == CORRECT)
+
+        meaning = meaning_text(self.word, word_store.meanings[index])
+        example = word_store.examples[index].rstrip(" .;")
+        example_text = f" For example: {example}." if example else ""
+        if verdict == CORRECT:
+            return f"That's right! {self.word} means {meaning}.{example_text}"
+        if verdict == WRONG:
+            return f"Not quite. {self.word} means {meaning}.{example_text}"
+        return None
+
+    def record_verdict(self, verdict):
+        """Save the LLM's verdict on a first answer; no tag counts as unsure"""
+        self.word_bank.record(self.word, None if verdict is UNJUDGED else verdict)
+
+    def may_grade_locally(self):
+        """Whether the next answer could be graded without the LLM"""
+        if grader is None or self.history.turns:
+            return False
+        index = word_store.index_of(self.word)
+        return index is not None and bool(word_store.meanings[index])
+
+    def speculate(self, text):
+        """Ask for the reply to a guessed answer while the user may still be talking
+
+        Skipped when the answer could be graded locally or is in the response
+        cache, and while the last reply is still being folded into the
+        history, so a guess only costs an LLM call when one would be needed.
+        """
+        guess = self.scheduler.speculation
+        if guess is not None and guess.key == normalize(text):
+            return  # Already asked; the guess is checked again on every block
+        if not SPECULATIVE_REPLIES or self.history is None or self.may_grade_locally():
+            return
+        if self.reply_task is not None and not self.reply_task.done():
+            return
+        messages = self.history.messages()
+        if response_cache.contains(ResponseCache.make_key(REPLY_MODEL, messages, text)):
+            return
+        messages.append({"role": "user", "content": text})
+        self.scheduler.speculate("llm", text, lambda: llm_calls.call(lambda: open_reply_stream(messages),
+                                                                     deadline=LLM_FIRST_TOKEN_DEADLINE),
+                                 close_reply_stream)
+
+    def listen(self):
+        """Wait for the user's next answer"""
+        self.finish_turn()
+        if self.state != LISTENING:
+            self.new_capture()
+            self.set_state(LISTENING)
+        # Use the user's speaking time to get the next word ready
+        self.start_prefetch()
+
+    def finish_turn(self, outcome="complete"):
+        """Close the current turn's trace; a complete turn ends when we are listening again"""
+        if self.turn_trace is None:
+            return
+        if outcome == "complete":
+            self.turn_trace.mark("listening")
+        self.turn_trace.finish(outcome)
+        self.turn_trace = None
+
+    # Speech in
+
+    def new_capture(self):
+        """Start a new turn's capture: audio still queued from the last one is dropped
+
+        The recognizer itself is reset by audio_loop before it decodes the
+        next block, so a reset never races a decode of the previous turn.
+        """
+        self.capture += 1
+        self.audio.clear()
+        self.barge_in_audio.clear()
+        self.answer_start = self.session.position
+        self.heard_at = None
+        self.scheduler.drop_speculation("new capture")
+
+    async def audio_loop(self):
+        speaking = (PROMPTING, PROMPT_PLAYING, THINKING, REPLY_PLAYING)
+        decoded = self.capture
+        while True:
+            block = await self.audio.read()  # A view into the ring, valid until the next read
+            self.input_meter.feed(block)
+            if self.recognizer is None:
+                continue
+            if self.reopen_requested and self.state != LISTENING:
+                await self.reopen_recognizer()
+            if decoded != self.capture:
+                if not self.recognizer_fresh:
+                    self.recognizer.reset()
+                self.recognizer_fresh = False
+                decoded = self.capture
+
+            if self.state in speaking:
+                if not self.barge_in:
+                    continue
+                if not self.recognizer.watch_barge_in(block, self.playback_level):
+                    self.barge_in_audio.append(block.copy())  # The ring reuses the view
+                    continue
+                # The user started talking over the reply; decode from where they began
+                print("Detected: barge-in")
+                blocks = [*self.barge_in_audio, block]
+                self.interrupt()
+            elif self.state == LISTENING:
+                blocks = [block]
+            else:
+                continue
+
+            for block in blocks:
+                if not await self.hear(block, decoded):
+                    break
+
+    async def hear(self, block, capture):
+        """Decode one block of the answer; False once the turn is over or has moved on"""
+        self.session.write_audio(block)
+        turn = await self.decode(block)
+        if self.state != LISTENING or capture != self.capture:
+            return False  # A typed answer or a command moved on meanwhile
+        if self.recognizer.partial:
+            if self.heard_at is None:
+                self.heard_at = time.perf_counter()
+            self.emit("on_partial", self.recognizer.partial)
+        if turn is not None:
+            self.state = THINKING  # Stop decoding until the turn has been handled
+            self.inputs.put_nowait(turn)
+            return False
+        if self.recognizer.speculation:
+            self.speculate(self.recognizer.speculation)
+        return True
+
+    async def decode(self, block):
+        """Decode one block off the loop so playback and the network keep flowing
+
+        If the caller is cancelled, this still waits for the decoding thread
+        to finish, so the recognizer is never reset or released mid-decode.
+        """
+        if self.decode_pool is not None:
+            decoding = asyncio.ensure_future(self.decode_pool.run(self.recognizer.process, block))
+        else:
+            decoding = asyncio.get_running_loop().run_in_executor(None, self.recognizer.process, block)
+        try:
+            return await asyncio.shield(decoding)
+        except asyncio.CancelledError:
+            await asyncio.wait([decoding])
+            raise
+
+    async def reopen_recognizer(self):
+        """Reset the recognizer off the loop while a reply is handled, so listening starts at once
+
+        The microphone stream itself stays open; the recognizer's reset is
+        the work that used to wait for the first block of the next answer.
+        """
+        self.reopen_requested = False
+        trace = self.turn_trace
+        if trace is not None:
+            trace.mark("mic_reopen")
+        resetting = asyncio.get_running_loop().run_in_executor(None, self.recognizer.reset)
+        try:
+            await asyncio.shield(resetting)
+        except asyncio.CancelledError:
+            await asyncio.wait([resetting])
+            raise
+        self.recognizer_fresh = True
+        if trace is not None:
+            trace.mark("mic_ready")
+
+    def interrupt(self):
+        """Stop whatever is being said and start listening (barge-in)"""
+        self.interrupted = True
+        if self.speech_task is not None:
+            self.speech_task.cancel()
+        self.finish_turn("barge_in")
+        self.set_state(LISTENING)
+        self.start_prefetch()
+
+    # Speech out
+
+    async def speak(self, coro):
+        """Play speech to the end; returns False if the user barged in"""
+        self.interrupted = False
+        if self.barge_in:
+            self.new_capture()
+        self.speech_task = self.scheduler.start("speech", coro, FOREGROUND, self.turn_token)
+        try:
+            await self.speech_task
+            return True
+        except asyncio.CancelledError:
+            if self.interrupted:
+                return False
+            raise
+        finally:
+            self.speech_task = None
+
+    async def play_prompt(self, text, audio=None):
+        meter_handles = []
+        try:
+            if audio is None:
+                audio = await render_speech(text, hedge=True)
+            samples = np.frombuffer(audio, dtype=np.int16)
+            self.playback_level = pcm_rms(samples)
+            meter_handles = self.output_meter.feed_later(asyncio.get_running_loop(), samples, 0, TTS_SAMPLE_RATE)
+            self.set_state(PROMPT_PLAYING)
+            await self.create_player().play(samples)
+        finally:
+            self.playback_level = 0.0
+            for handle in meter_handles:
+                handle.cancel()
+
+    async def ask_gpt4o(self, user_input, sentences, trace, cache_key=None, speculation=None, judge=False):
+        """Stream a reply to TTS; judge saves the verdict the reply opens with, for a first answer"""
+        deltas = []
+        spoken = []  # The reply as it was split for TTS, for the response cache
+        head = ""  # The start of the reply, until any verdict tag has been taken off
+        tag = ""
+        verdict = UNJUDGED
+        try:
+            # Add the user's input to the conversation history
+            self.history.append("user", user_input)
+
+            # Stream the reply from GPT-4o with the seed, summary and recent turns.
+            # Retries stop at the first token; after that they would repeat what was said.
+            messages = self.history.messages()
+            trace.tags["prompt_tokens"] = self.history.last_prompt_tokens
+            if speculation is not None:
+                # Requested while the user was finishing; often the first token is already here
+                trace.mark("llm_request", speculation.started)
+                stream, events, delta = await speculation.task
+            else:
+                trace.mark("llm_request")
+                stream, events, delta = await llm_calls.call(lambda: open_reply_stream(messages),
+                                                            deadline=LLM_FIRST_TOKEN_DEADLINE)
+            trace.mark("llm_first_token")
+
+            # Hand each complete sentence to TTS while the rest is still generating
+            pending = ""
+            async with stream, asyncio.timeout(LLM_REPLY_TIMEOUT):
+                while delta is not None:
+                    if head is not None:
+                        head += delta
+                        if not verdict_read(head):
+                            delta = await anext(events, None)
+                            continue
+                        verdict, delta = split_verdict(head)
+                        tag, head = head[:len(head) - len(delta)].strip(), None
+                    deltas.append(delta)
+                    ready, pending = split_sentences(pending + delta)
+                    for sentence in ready:
+                        sentences.put_nowait(sentence)
+                        spoken.append(sentence)
+                    delta = await anext(events, None)
+            if head is not None:
+                # The whole reply was no longer than a tag
+                verdict, delta = split_verdict(head)
+                tag = head[:len(head) - len(delta)].strip()
+                deltas.append(delta)
+                pending += delta
+
+            if pending.strip():
+                sentences.put_nowait(pending.strip())
+                spoken.append(pending.strip())
+
+            reply = "".join(deltas).strip()
+            trace.mark("llm_done")
+
+            # Add the assistant's response to the conversation history
+            self.history.append("assistant", reply)
+            if cache_key is not None:
+                if tag and spoken:
+                    # Keep the tag on the first sentence so a cached reply still carries its verdict
+                    spoken = [f"{tag} {spoken[0]}"] + spoken[1:]
+                response_cache.put(cache_key, spoken)
+
+        except Exception as e:
+            print(f"Error from GPT-4o: {type(e).__name__}: {e}")
+            trace.tags["llm_error"] = f"{type(e).__name__}: {e}"
+            if not deltas:
+                sentences.put_nowait(LLM_FALLBACK_REPLY)
+            return
+        finally:
+            # Tell the TTS side that no more sentences are coming
+            sentences.put_nowait(None)
+            if judge:
+                self.record_verdict(verdict)
+
+        # Fold older turns into the summary while the reply is still playing
+        await self.history.compact()
+
+    async def local_reply(self, user_input, reply, sentences):
+        try:
+            self.history.append("user", user_input)
+            ready, remainder = split_sentences(reply)
+            for sentence in ready + [remainder.strip()]:
+                if sentence:
+                    sentences.put_nowait(sentence)
+            self.history.append("assistant", reply)
+        finally:
+            sentences.put_nowait(None)
+
+    async def cached_reply(self, user_input, cached, sentences, judge=False):
+        """Replay a cached reply; its sentences are likely still in the speech cache"""
+        verdict, first = split_verdict(cached[0])
+        cached = [first] + cached[1:] if first else cached[1:]
+        if judge:
+            self.record_verdict(verdict)
+        try:
+            self.history.append("user", user_input)
+            for sentence in cached:
+                sentences.put_nowait(sentence)
+            self.history.append("assistant", " ".join(cached))
+        finally:
+            sentences.put_nowait(None)
+        await self.history.compact()
+
+    async def speak_sentences(self, sentences, trace):
+        # Sentences being synthesized, in reply order; bounded so we only run a few ahead
+        pending = asyncio.Queue(maxsize=TTS_LOOKAHEAD)
+        feeder = asyncio.create_task(self.feed_sentences(sentences, pending, trace))
+        try:
+            # One output stream for the whole reply keeps sentence joins gapless
+            player = self.create_player()
+            await player.play_stream(self.audio_chunks(pending, trace))
+            trace.mark("playback_end")
+            first_sample = getattr(player, "first_sample_at", None)
+            if first_sample is not None:
+                trace.mark("first_sample", first_sample)
+        finally:
+            feeder.cancel()
+
+    async def feed_sentences(self, sentences, pending, trace):
+        spoken = []
+        tasks = []
+        try:
+            while True:
+                sentence = await sentences.get()
+                if sentence is None:
+                    await pending.put(None)
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    trace.mark("tts_done")
+                    return
+                self.emit("on_reply_text", sentence)
+                spoken.append(sentence)
+                chunks = asyncio.Queue()
+                synthesis = self.synthesize(sentence, chunks, trace if len(spoken) == 1 else None)
+                task = self.scheduler.start("tts", synthesis, FOREGROUND, self.turn_token)
+                tasks.append(task)
+                await pending.put((task, chunks))
+        finally:
+            # Stop TTS streams still downloading for a reply that is no longer playing
+            for task in tasks:
+                task.cancel()
+            # What was handed to speech, even if the user barged in partway
+            if spoken:
+                self.session.record("reply", self.word, " ".join(spoken))
+
+    async def synthesize(self, text, chunks, trace=None):
+        try:
+            if trace is not None:
+                trace.mark("tts_request")
+            key = speech_cache_key(text)
+            audio = tts_cache.get(key)
+            if audio is not None:
+                if trace is not None:
+                    trace.tags["tts_cached"] = True
+                    trace.mark("tts_first_byte")
+                await chunks.put(audio)
+                return
+
+            # Play chunks as they arrive and keep them for the cache; the request
+            # is retried until the first chunk arrives
+            stack, stream, first = await tts_calls.call(lambda: open_speech(text))
+            if trace is not None:
+                trace.mark("tts_first_byte")
+            rendered = [first]
+            await chunks.put(first)
+            async with stack, asyncio.timeout(TTS_RENDER_TIMEOUT):
+                async for chunk in stream:
+                    rendered.append(chunk)
+                    await chunks.put(chunk)
+            tts_cache.put(key, b"".join(rendered))
+        except Exception as e:
+            print(f"Error in TTS streaming: {e}")
+            raise
+        finally:
+            await chunks.put(None)
+
+    async def audio_chunks(self, pending, trace):
+        loop = asyncio.get_running_loop()
+        started_at = None
+        samples_sent = 0
+        meter_handles = []
+        try:
+            while True:
+                item = await pending.get()
+                if item is None:
+                    return
+                task, chunks = item
+                while True:
+                    chunk = await chunks.get()
+                    if chunk is None:
+                        break
+                    samples = np.frombuffer(chunk, dtype=np.int16)
+                    if started_at is None:
+                        started_at = loop.time()
+                        trace.mark("playback_start")
+                        self.set_state(REPLY_PLAYING)
+
+                    # Stay about TTS_MAX_AHEAD seconds ahead of the speaker, so the player's
+                    # queue stays short, playback stops promptly when cancelled and
+                    # playback_level tracks what is actually being heard
+                    ahead = samples_sent / TTS_SAMPLE_RATE - (loop.time() - started_at)
+                    if ahead < 0:
+                        # Playback ran dry (underrun); restart the clock from here
+                        started_at = loop.time() - samples_sent / TTS_SAMPLE_RATE
+                    elif ahead > TTS_MAX_AHEAD and self.realtime:
+                        await asyncio.sleep(ahead - TTS_MAX_AHEAD)
+
+                    self.playback_level = pcm_rms(samples)
+
+                    # Meter the chunk for the waveform when it will actually be heard
+                    delay = max(0.0, samples_sent / TTS_SAMPLE_RATE - (loop.time() - started_at))
+                    meter_handles.extend(self.output_meter.feed_later(loop, samples, delay, TTS_SAMPLE_RATE))
+
+                    samples_sent += len(samples)
+                    yield samples
+                # Surface synthesis errors for this sentence
+                await task
+        finally:
+            self.playback_level = 0.0
+            for handle in meter_handles:
+                handle.cancel()
+
+    # Next-word prefetch
+
+    def start_prefetch(self):
+        task = self.prefetch_task
+        # Keep a prefetch that is running or succeeded; retry one that failed or was preempted
+        if task is not None and not (task.done() and (task.cancelled() or task.result() is None)):
+            return
+        # Background work: a turn's reply (or a speculative one) cancels it if it is still running
+        self.prefetch_task = self.scheduler.start("prefetch", self.prefetch(self.word), BACKGROUND,
+                                                  preemptible=True)
+
+    async def take_prefetched(self):
+        """The prefetched (word, audio), waiting for one in flight; None if there is none"""
+        task, self.prefetch_task = self.prefetch_task, None
+        if task is None:
+            return None
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return None
+            raise
+
+    async def prefetch(self, current_word):
+        """Pick the next word and render its prompt while the user talks"""
+        try:
+            word = await self.pick_word(exclude=current_word)
+            audio = await asyncio.wait_for(fetch_prompt(word), PREFETCH_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # A failed prefetch just means the next word is fetched on demand
+            print(f"Prefetch error: {e}")
+            return None
+
+        if audio is None:
+            return None
+        print(f"Prefetched next word: {word}")
+        return (word, audio)
@@ -0,0 +1,122 @@
+import re
+import math
+import numpy as np
+
+CORRECT = "correct"
+WRONG = "wrong"
+UNSURE = "unsure"
+
+# Answers that say the learner doesn't know, with the word itself already removed
+NON_ANSWER = re.compile(
+    r"(?:(?:um+|uh+|hmm+|well|sorry|so)\s+)*(?:i\s+|i'm\s+|i am\s+)?"
+    r"(?:don't know|dont know|do not know|have no idea|no idea|not sure|have no clue|no clue|"
+    r"forgot|forget|can't remember|cannot remember|don't remember|have never heard of it)"
+    r"(?:\s+(?:it|this|that|this one|this word|that word|the word|the meaning|what it means|what means))?"
+    r"|pass|skip|tell me")
+
+
+def char_ngrams(text, n=3):
+    """Character n-grams taken inside word boundaries, like scikit-learn's char_wb"""
+    grams = []
+    for word in re.findall(r"[a-z]+", text.lower()):
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams.append(padded)
+        else:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+class LocalGrader:
+    """Grades spoken explanations against stored meanings with character n-gram TF-IDF
+
+    TF-IDF vectors for every meaning are built once and kept as CSR arrays
+    (indptr, indices, data), so an explanation can be scored against the whole
+    list with a few NumPy operations. Clear matches get an instant verdict.
+    A low score is not a miss: a correct paraphrase shares few letters with
+    the stored meaning. So only an explicit non-answer ("I don't know") is
+    graded wrong, or a score at or below wrong_threshold if one has been
+    calibrated (0 turns that off). Anything else is left to the LLM.
+    """
+
+    def __init__(self, meanings, ngram=3, correct_threshold=0.45, wrong_threshold=0.0,
+                 margin=0.05):
+        self.ngram = ngram
+        self.correct_threshold = correct_threshold
+        self.wrong_threshold = wrong_threshold
+        self.margin = margin
+
+        # Vocabulary and document frequencies
+        self.vocab = {}
+        rows = []
+        for meaning in meanings:
+            counts = {}
+            for gram in char_ngrams(meaning, ngram):
+                index = self.vocab.setdefault(gram, len(self.vocab))
+                counts[index] = counts.get(index, 0) + 1
+            rows.append(counts)
+
+        doc_freq = np.zeros(len(self.vocab), dtype=np.float32)
+        for counts in rows:
+            doc_freq[list(counts)] += 1
+        self.idf = np.log((1 + len(rows)) / (1 + doc_freq)) + 1
+        self.unknown_idf = math.log(1 + len(rows)) + 1
+
+        # L2-normalised TF-IDF rows in CSR form
+        self.indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indices, data = [], []
+        for i, counts in enumerate(rows):
+            row_indices = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            row_data = np.fromiter(counts.values(), dtype=np.float32, count=len(counts)) * self.idf[row_indices]
+            norm = np.linalg.norm(row_data)
+            if norm:
+                row_data /= norm
+            indices.append(row_indices)
+            data.append(row_data)
+            self.indptr[i + 1] = self.indptr[i] + len(counts)
+        self.indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+        self.data = np.concatenate(data) if data else np.zeros(0, dtype=np.float32)
+
+    def vectorize(self, text):
+        """Dense TF-IDF vector of text over the meaning vocabulary, L2-normalised"""
+        query = np.zeros(len(self.vocab), dtype=np.float32)
+        unknown_weight = 0.0
+        for gram in char_ngrams(text, self.ngram):
+            index = self.vocab.get(gram)
+            if index is None:
+                unknown_weight += self.unknown_idf ** 2
+            else:
+                query[index] += 1
+        query *= self.idf
+
+        # N-grams no meaning contains still count towards the length of the answer
+        norm = math.sqrt(float(query @ query) + unknown_weight)
+        return query / norm if norm else query
+
+    def scores(self, text):
+        """Cosine similarity of text against every stored meaning"""
+        query = self.vectorize(text)
+        products = self.data * query[self.indices]
+        # Row sums from a running total; empty meanings come out as zero
+        totals = np.zeros(len(products) + 1, dtype=np.float64)
+        np.cumsum(products, out=totals[1:])
+        return totals[self.indptr[1:]] - totals[self.indptr[:-1]]
+
+    def grade(self, index, text, word=""):
+        """Return (verdict, score) for an explanation of the word at index"""
+        # Saying the word itself proves nothing about its meaning
+        if word:
+            text = re.sub(rf"\b{re.escape(word.lower())}\b", " ", text.lower())
+        if NON_ANSWER.fullmatch(" ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())):
+            return WRONG, 0.0
+
+        scores = self.scores(text)
+        score = float(scores[index])
+        scores[index] = -np.inf
+        best_other = float(scores.max()) if len(scores) > 1 else 0.0
+
+        if score >= self.correct_threshold and score >= best_other + self.margin:
+            return CORRECT, score
+        if self.wrong_threshold > 0 and score <= self.wrong_threshold:
+            return WRONG, score
+        return UNSURE, score
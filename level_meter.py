@@ -0,0 +1,65 @@
+import time
+import numpy as np
+
+FULL_SCALE = 32768.0
+FLOOR_DB = -60.0  # Levels at or below this show as empty bars
+
+
+class LevelMeter:
+    """Turns int16 audio into a fixed-size array of bar levels for the waveform
+
+    Each block is split into num_bands equal slices; the RMS and peak of each
+    slice are mapped onto a 0..1 decibel scale. Work is throttled to one update
+    per interval, and the result is published by swapping in a new array, so
+    the UI can read `latest` at any time without locks.
+    """
+
+    def __init__(self, num_bands=20, interval=0.05):
+        self.num_bands = num_bands
+        self.interval = interval
+        self.last_update = 0.0
+
+        # Latest-value slot: (levels, updated_at), replaced as a whole, never mutated
+        self.latest = None
+
+    def feed(self, samples):
+        """Meter a block of int16 samples unless the last update was too recent"""
+        now = time.monotonic()
+        if now - self.last_update < self.interval:
+            return
+        usable = len(samples) - len(samples) % self.num_bands
+        if usable == 0:
+            return
+        self.last_update = now
+
+        bands = samples[:usable].reshape(self.num_bands, -1).astype(np.float32)
+        rms = np.sqrt(np.mean(bands * bands, axis=1))
+        peak = np.abs(bands).max(axis=1)
+
+        # Blend in half the peak so short transients still show up
+        level = np.maximum(rms, 0.5 * peak) / FULL_SCALE
+        db = 20.0 * np.log10(np.maximum(level, 1e-6))
+        levels = np.clip((db - FLOOR_DB) / -FLOOR_DB, 0.0, 1.0)
+        self.latest = (levels, now)
+
+    def feed_later(self, loop, samples, delay, sample_rate):
+        """Schedule metering of samples as they will be heard, starting in delay seconds
+
+        Returns the timer handles so they can be cancelled if playback stops.
+        """
+        window = max(1, int(sample_rate * self.interval))
+        handles = []
+        for start in range(0, len(samples), window):
+            handles.append(loop.call_later(delay + start / sample_rate,
+                                           self.feed, samples[start:start + window]))
+        return handles
+
+    def levels(self, max_age=0.3):
+        """Latest levels, zeros once they are older than max_age, or None if never fed"""
+        latest = self.latest
+        if latest is None:
+            return None
+        levels, updated_at = latest
+        if time.monotonic() - updated_at > max_age:
+            return np.zeros(self.num_bands, dtype=np.float32)
+        return levels
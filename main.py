@@ -1,337 +1,163 @@
+# Start the startup clock before anything heavy is imported
+from startup_report import StartupReport
+startup = StartupReport()
+
 import sys
-import pandas as pd
-import queue
-import sounddevice as sd
-import vosk
-import json
-import asyncio
-import threading
-from openai import AsyncOpenAI
-from openai import OpenAI
-from openai.helpers import LocalAudioPlayer
-from PySide6.QtCore import Qt, QThreadPool, QRunnable, Signal, Slot, QObject
+from PySide6.QtCore import Signal, QObject
 from PySide6.QtWidgets import QApplication
 
 # Import the Siri-like bubble interface
 from siri_bubble import SiriBubbleWindow
 
-# Load environment variables
-from dotenv import load_dotenv
-import os
-load_dotenv()
-
-# Global variables
-chosen_word = None
-conversation_history = []
-
-# Setup OpenAI clients
-openai = AsyncOpenAI()
-client = OpenAI()
-
-# Voice instructions for text-to-speech
-instructions = """Delivery: Exaggerated and theatrical, with dramatic pauses, sudden outbursts, and gleeful cackling.
-Voice: High-energy, eccentric, and slightly unhinged, with a manic enthusiasm that rises and falls unpredictably.
-Tone: Excited, chaotic, and grandiose, as if reveling in the brilliance of a mad experiment.
-Pronunciation: Sharp and expressive, with elongated vowels, sudden inflections, and an emphasis on big words to sound more diabolical."""
-
-# Load words list
-try:
-    words_list_df = pd.read_csv('words_list.csv')
-except Exception as e:
-    print(f"Error loading words list: {e}")
-    # Create a sample word list if file not found
-    words_list_df = pd.DataFrame({
-        'word': ['serendipity', 'ephemeral', 'ubiquitous', 'esoteric', 'pragmatic', 
-                'eloquent', 'paradox', 'ambiguous', 'meticulous', 'resilient']
-    })
+# The conversation itself runs in the engine, independent of this window
+import engine
+from engine import ConversationEngine, EngineEvents, runtime, tracer, prerender_words
 
-# Setup audio parameters
-SAMPLE_RATE = 16000
-BLOCK_SIZE = 8000
-MODEL_PATH = "vosk-model-small-en-us-0.15"  # Adjust path as needed
+import os
+startup.mark("imports")
 
-# Initialize Vosk model
-try:
-    model = vosk.Model(MODEL_PATH)
-    rec = vosk.KaldiRecognizer(model, SAMPLE_RATE)
-except Exception as e:
-    print(f"Error loading Vosk model: {e}")
-    print("Please download the Vosk model from https://alphacephei.com/vosk/models")
-    print("and place it in the correct directory")
-    sys.exit(1)
+# Startup timings are appended here so regressions show up
+STARTUP_REPORT_FILE = os.getenv("STARTUP_REPORT_FILE", "startup_times.jsonl")
 
-q = queue.Queue()
+# Open the microphone, importing sounddevice only when first needed
+def open_input_stream(callback):
+    import sounddevice as sd
+    return sd.RawInputStream(samplerate=engine.SAMPLE_RATE, blocksize=engine.BLOCK_SIZE,
+                             dtype='int16', channels=1, callback=callback)
 
-# Worker signal class for threading
-class WorkerSignals(QObject):
-    finished = Signal()
+# Engine events, re-emitted as Qt signals so the window is only touched from the Qt thread
+class EngineSignals(QObject):
+    state = Signal(str, str)
+    partial = Signal(str)
     error = Signal(str)
-    result = Signal(object)
-    progress = Signal(int)
-    status_update = Signal(str)
+    finished = Signal()
 
-# Audio callback function
-def audio_callback(indata, frames, time, status):
-    if status:
-        print("Audio status:", status, file=sys.stderr)
-    q.put(bytes(indata))
+class QtEvents(EngineEvents):
+    def __init__(self, signals):
+        self.signals = signals
 
-# Worker class for speech recognition
-class SpeechRecognitionWorker(QRunnable):
-    def __init__(self):
-        super().__init__()
-        self.signals = WorkerSignals()
-        self.is_running = True
-    
-    @Slot()
-    def run(self):
-        user_input_string = ""
-        
-        try:
-            with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=BLOCK_SIZE,
-                                dtype='int16', channels=1, callback=audio_callback):
-                
-                # Signal that we're ready to listen
-                self.signals.status_update.emit("LISTENING")
-                
-                while self.is_running:
-                    data = q.get()
-                    if rec.AcceptWaveform(data):
-                        result = json.loads(rec.Result())
-                        text = result.get("text", "")
-                        print("CURRENT TEXT IS : ",text.strip())
-                        if "up to you" in text.strip() or "upto you" in text.strip() or "your turn" in text.strip() or "next to you" in text.strip() or "over to you" in text.strip() :
-                            print('$$$$ got it you are saying', text.strip())
-                            self.signals.result.emit(user_input_string)
-                            break
-                        
-                        if "give me a new word" in text.strip() or "new word" in text.strip()  or "another word" in text.strip():
-                            print("Detected: change word please")
-                            self.signals.status_update.emit("CHANGE_WORD")
-                            user_input_string = "change word please"
-                            self.signals.result.emit(user_input_string)
-                            break
-                            
-                        if "goodbye" in text.strip() or "good bye" in text.strip():
-                            print("Detected: close this conversation please")
-                            self.signals.status_update.emit("CLOSE")
-                            user_input_string = "close this conversation please"
-                            self.signals.result.emit(user_input_string)
-                            break
-                        
-                        if text.strip():
-                            user_input_string += text + " "
-                            print("You said:", text)
-                            # Update status
-                            self.signals.progress.emit(len(user_input_string))
-                        
-                    else:
-                        partial = json.loads(rec.PartialResult())
-                        print("...", partial.get("partial", ""), end="\r")
-        
-        except Exception as e:
-            print(f"Speech recognition error: {e}")
-            self.signals.error.emit(str(e))
-        finally:
-            self.signals.finished.emit()
-    
-    def stop(self):
-        self.is_running = False
-
-# Worker for GPT-4o processing
-class GPT4oWorker(QRunnable):
-    def __init__(self, user_input):
-        super().__init__()
-        self.signals = WorkerSignals()
-        self.user_input = user_input
-    
-    @Slot()
-    def run(self):
-        try:
-            response = self.ask_gpt4o(self.user_input)
-            self.signals.result.emit(response)
-        except Exception as e:
-            print(f"GPT-4o error: {e}")
-            self.signals.error.emit(str(e))
-        finally:
-            self.signals.finished.emit()
-    
-    def ask_gpt4o(self, user_input):
-        global conversation_history
-        
-        try:
-            # Add the user's input to the conversation history
-            conversation_history.append({"role": "user", "content": user_input})
-            
-            # Make the request to GPT-4o with the full conversation context
-            response = client.responses.create(
-                model="gpt-4o",
-                input=conversation_history  # Pass all previous messages for context
-            )
+    def on_state(self, state, word):
+        self.signals.state.emit(state, word or "")
 
-            # Extract the assistant's reply
-            reply = response.output_text.strip()
+    def on_partial(self, text):
+        self.signals.partial.emit(text)
 
-            # Add the assistant's response to the conversation history
-            conversation_history.append({"role": "assistant", "content": reply})
+    def on_user_text(self, text):
+        print("You said:", text)
 
-            return reply
+    def on_reply_text(self, text):
+        print(f"Speaking sentence: {text[:50]}...")
 
-        except Exception as e:
-            return f"Error from GPT-4o: {e}"
-
-# TTS Worker
-class TTSWorker(QRunnable):
-    def __init__(self, text):
-        super().__init__()
-        self.signals = WorkerSignals()
-        self.text = text
-    
-    @Slot()
-    def run(self):
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self.get_text_to_speech(self.text))
-            self.signals.result.emit("TTS_COMPLETE")
-        except Exception as e:
-            print(f"TTS error: {e}")
-            self.signals.error.emit(str(e))
-        finally:
-            self.signals.finished.emit()
-    
-    async def get_text_to_speech(self, inp_text):
-        try:
-            async with openai.audio.speech.with_streaming_response.create(
-                model="gpt-4o-mini-tts",
-                voice="coral",
-                input=inp_text,
-                instructions=instructions,
-                response_format="pcm",
-            ) as response:
-                await LocalAudioPlayer().play(response)
-        except Exception as e:
-            print(f"Error in TTS streaming: {e}")
-            raise
+    def on_error(self, message):
+        self.signals.error.emit(message)
 
 # Main application class
 class VocabularyApp:
     def __init__(self):
         self.app = QApplication(sys.argv)
         self.bubble_window = SiriBubbleWindow()
-        self.thread_pool = QThreadPool()
-        
-        # Set maximum thread count
-        self.thread_pool.setMaxThreadCount(5)
-        
-        # Current state
-        self.listening = False
-        self.processing = False
-        self.speaking = False
-        
-        # Initialize speech recognition worker
-        self.speech_worker = None
-        
+
+        self.signals = EngineSignals()
+        self.signals.state.connect(self.on_state)
+        self.signals.partial.connect(self.on_partial)
+        self.signals.error.connect(self.on_error)
+        self.signals.finished.connect(self.on_finished)
+
+        self.engine = ConversationEngine(QtEvents(self.signals), startup=startup)
+        self.bubble_window.waveform.set_level_meters(self.engine.input_meter, self.engine.output_meter)
+
+        # Microphone stream, opened once the engine is ready and kept open for the session
+        self.input_stream = None
+        self.session = None
+
     def start(self):
         print("Starting vocabulary practice application...")
         self.bubble_window.show()
-        self.select_new_word()
+        self.bubble_window.show_warming_up()
+        startup.mark("window_shown")
+
+        # Load the speech model in the background and fetch the first word meanwhile
+        self.session = runtime.submit(self.engine.run())
+        self.session.add_done_callback(lambda future: self.signals.finished.emit())
+
         return self.app.exec()
-        
-    def select_new_word(self):
-        global chosen_word
-        global conversation_history
-        
-        print("Selecting a new word...")
-        
-        # Reset UI
-        self.bubble_window.reset()
-        
-        # Select a new word
-        chosen_word = words_list_df.sample(n=1).iloc[0]["word"]
-        print(f"Selected word: {chosen_word}")
-        
-        # Reset conversation history for new word
-        conversation_history = [
-            {"role": "system", "content": "You are a helpful, friendly AI assistant."},
-            {"role": "user", "content": "I want to practice some word meanings of English language which people use in their day to day life"},
-            {"role": "assistant", "content": f"Great! You can start with {chosen_word}. Explain the meaning of this word if you know, otherwise I will tell you."}
-        ]
-        
-        # Display the word and prepare TTS prompt
-        self.bubble_window.set_word(f"Explain: {chosen_word}")
-        
-        # Start TTS for the prompt
-        tts_worker = TTSWorker(f'Explain the meaning of {chosen_word}')
-        tts_worker.signals.finished.connect(self.on_tts_finished)
-        tts_worker.signals.error.connect(self.on_error)
-        self.bubble_window.start_speaking()
-        self.thread_pool.start(tts_worker)
-    
-    def on_tts_finished(self):
-        print("TTS finished, starting listening...")
-        # Start listening for user input
-        self.start_listening()
-    
-    def start_listening(self):
-        # Update UI
-        self.bubble_window.start_listening()
-        
-        # Start speech recognition worker
-        self.speech_worker = SpeechRecognitionWorker()
-        self.speech_worker.signals.result.connect(self.on_speech_result)
-        self.speech_worker.signals.error.connect(self.on_error)
-        self.speech_worker.signals.status_update.connect(self.on_status_update)
-        self.thread_pool.start(self.speech_worker)
-    
-    def on_speech_result(self, user_input):
-        print(f"Received speech result: {user_input[:50]}...")
-        
-        if user_input == "change word please":
-            print("Changing word...")
-            self.select_new_word()
-            return
-        
-        if user_input == "close this conversation please":
-            print("Closing application...")
-            self.app.quit()
-            return
-        
-        # Process with GPT-4o
-        self.bubble_window.start_processing()
-        
-        gpt_worker = GPT4oWorker(user_input)
-        gpt_worker.signals.result.connect(self.on_gpt_result)
-        gpt_worker.signals.error.connect(self.on_error)
-        self.thread_pool.start(gpt_worker)
-    
-    def on_gpt_result(self, response):
-        print(f"Received GPT response: {response[:50]}...")
-        # Speak the response
-        self.bubble_window.start_speaking(f"Responding: {chosen_word}")
-        
-        tts_worker = TTSWorker(response)
-        tts_worker.signals.finished.connect(self.after_response)
-        tts_worker.signals.error.connect(self.on_error)
-        self.thread_pool.start(tts_worker)
-    
-    def after_response(self):
-        print("Response complete, listening for next input...")
-        # After speaking the response, go back to listening
-        self.start_listening()
-    
-    def on_status_update(self, status):
-        print(f"Status update: {status}")
-        
+
+    def open_microphone(self):
+        try:
+            self.input_stream = open_input_stream(self.engine.audio_callback)
+            self.input_stream.start()
+        except Exception as e:
+            print(f"Speech recognition error: {e}")
+            self.on_error(str(e))
+
+    def on_state(self, state, word):
+        print(f"Status update: {state}")
+        if state != engine.WARMING_UP and self.input_stream is None:
+            self.open_microphone()
+
+        if state == engine.PROMPTING:
+            print(f"Selected word: {word}")
+            self.bubble_window.reset()
+            self.bubble_window.set_word(f"Explain: {word}")
+            self.bubble_window.start_speaking()
+        elif state == engine.PROMPT_PLAYING:
+            self.on_prompt_speaking()
+        elif state == engine.LISTENING:
+            self.bubble_window.start_listening()
+        elif state == engine.THINKING:
+            self.bubble_window.start_processing()
+        elif state == engine.REPLY_PLAYING:
+            # The first sentence is playing; show the speaking animation
+            self.bubble_window.start_speaking(f"Responding: {word}")
+
+    def on_prompt_speaking(self):
+        if startup.mark("first_prompt_audio"):
+            print(f"Startup: {startup.summary()}")
+            try:
+                startup.write(STARTUP_REPORT_FILE)
+            except OSError as e:
+                print(f"Could not write startup report: {e}")
+
+    def on_partial(self, text):
+        print("...", text, end="\r")
+
     def on_error(self, error_msg):
         print(f"Error: {error_msg}")
-        # Handle error and recover
+        # The engine picks a new word after a short delay
         self.bubble_window.reset()
         self.bubble_window.set_word(f"Error: {error_msg[:20]}...")
-        
-        # Try to recover after a short delay
-        QTimer.singleShot(3000, self.select_new_word)
+
+    def on_finished(self):
+        if self.input_stream is not None:
+            self.input_stream.stop()
+            self.input_stream.close()
+            self.input_stream = None
+
+        error = self.session.exception() if not self.session.cancelled() else None
+        if isinstance(error, engine.SpeechModelError):
+            print(f"Error loading Vosk model: {error}")
+            print("Please download the Vosk model from https://alphacephei.com/vosk/models")
+            print("and place it in the correct directory")
+            self.app.exit(1)
+        elif error is not None:
+            print(f"Error: {type(error).__name__}: {error}")
+            self.app.exit(1)
+        else:
+            print("Closing application...")
+            self.app.quit()
 
 if __name__ == "__main__":
+    if "--prerender" in sys.argv:
+        runtime.run(prerender_words(engine.load_word_bank().store.words))
+        runtime.stop()
+        sys.exit(0)
+
     app = VocabularyApp()
-    sys.exit(app.start())
\ No newline at end of file
+    exit_code = app.start()
+    engine.close_audio_player()
+    print(f"Response cache: {engine.response_cache.stats()}")
+    print(f"Scheduler: {engine.scheduler_stats.stats()}")
+    engine.session_log.close()
+    tracer.close()
+    runtime.stop()
+    sys.exit(exit_code)
@@ -0,0 +1,197 @@
+import time
+import asyncio
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-size int16 FIFO shared by the event loop (writer) and the audio thread (reader)
+
+    Storage is allocated once; write() and read_into() copy with at most two
+    slices each and never allocate, so the audio callback stays cheap.
+    written and read count every sample that has gone in and out; clear()
+    counts what it drops as read, so read catches up with written.
+    """
+
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.start = 0   # Index of the oldest sample
+        self.size = 0    # Samples stored
+        self.written = 0
+        self.read = 0
+        self.lock = threading.Lock()
+
+    def write(self, samples):
+        """Append as many samples as fit; returns how many were taken"""
+        with self.lock:
+            count = min(len(samples), self.capacity - self.size)
+            end = (self.start + self.size) % self.capacity
+            first = min(count, self.capacity - end)
+            self.data[end:end + first] = samples[:first]
+            self.data[:count - first] = samples[first:count]
+            self.size += count
+            self.written += count
+            return count
+
+    def read_into(self, out):
+        """Fill out from the front of the buffer; returns how many samples were copied"""
+        with self.lock:
+            count = min(len(out), self.size)
+            first = min(count, self.capacity - self.start)
+            out[:first] = self.data[self.start:self.start + first]
+            out[first:count] = self.data[:count - first]
+            self.start = (self.start + count) % self.capacity
+            self.size -= count
+            self.read += count
+            return count
+
+    def clear(self):
+        with self.lock:
+            self.start = 0
+            self.size = 0
+            self.read = self.written
+
+    def __len__(self):
+        return self.size
+
+
+class PcmPlayer:
+    """Plays 16-bit mono PCM through one output stream that stays open
+
+    Utterances are written into a preallocated ring buffer that the stream's
+    callback drains. Playback of an utterance starts once prebuffer_ms of it
+    is buffered (or all of it, if shorter); if the buffer then runs dry the
+    gap is filled with silence, counted as an underrun, and playback resumes
+    after prebuffering again. Because the stream is never reopened, the next
+    utterance follows the previous one without a gap. Cancelling play() or
+    play_stream() silences the output within one callback block.
+
+    time_to_first_sample is how long the last utterance took from being
+    handed to the player to its first sample reaching the device.
+    """
+
+    def __init__(self, sample_rate=24000, device=None, prebuffer_ms=150, buffer_seconds=4.0,
+                 block_ms=20):
+        self.sample_rate = sample_rate
+        self.device = device
+        self.prebuffer = int(sample_rate * prebuffer_ms / 1000)
+        self.block_size = int(sample_rate * block_ms / 1000)
+        self.ring = RingBuffer(int(sample_rate * buffer_seconds))
+        self.stream = None
+
+        # Shared with the audio thread; samples written and played are counted by the ring
+        self.playing = False      # Past the prebuffer, draining the ring
+        self.ending = False       # The current utterance has been fully written
+        self.waiter = None        # (sample count, loop, future) resolved once ring.read reaches it
+
+        self.utterance_started = None
+        self.first_sample_at = None
+        self.time_to_first_sample = None
+        self.underruns = 0
+        self.utterances = 0
+
+    def open(self):
+        if self.stream is None:
+            import sounddevice as sd
+            self.stream = sd.OutputStream(samplerate=self.sample_rate, blocksize=self.block_size,
+                                          device=self.device, channels=1, dtype='int16',
+                                          latency='low', callback=self.callback)
+            self.stream.start()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    # Audio thread
+
+    def callback(self, outdata, frames, time_info, status):
+        out = outdata[:, 0]
+        if not self.playing and (len(self.ring) >= self.prebuffer or (self.ending and len(self.ring))):
+            self.playing = True
+
+        count = self.ring.read_into(out) if self.playing else 0
+        out[count:] = 0
+        if count == 0:
+            if self.playing and not self.ending:
+                self.underruns += 1
+            self.playing = False
+        elif self.first_sample_at is None:
+            # When the block reaches the speaker, not just when it was handed over
+            dac_delay = getattr(time_info, "outputBufferDacTime", 0) - getattr(time_info, "currentTime", 0)
+            self.first_sample_at = time.perf_counter() + max(0.0, dac_delay)
+
+        # Checked on empty blocks too: a waiter set after the last samples played still resolves
+        waiter = self.waiter
+        if waiter is not None and self.ring.read >= waiter[0]:
+            self.waiter = None
+            waiter[1].call_soon_threadsafe(self.resolve, waiter[2])
+
+    @staticmethod
+    def resolve(future):
+        if not future.done():
+            future.set_result(None)
+
+    # Event loop
+
+    def begin(self):
+        self.open()
+        self.ending = False
+        self.utterance_started = time.perf_counter()
+        self.first_sample_at = None
+        self.utterances += 1
+
+    async def write(self, samples):
+        """Queue samples, waiting for room while the ring is full"""
+        samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+        while len(samples):
+            count = self.ring.write(samples)
+            samples = samples[count:]
+            if len(samples):
+                await asyncio.sleep(self.block_size / self.sample_rate)
+
+    async def finish(self):
+        """Let the rest of the utterance play out and wait until it has"""
+        self.ending = True
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.waiter = (self.ring.written, loop, future)
+        if self.ring.read >= self.ring.written:
+            self.waiter = None
+            future.set_result(None)
+        await future
+        if self.first_sample_at is not None:
+            self.time_to_first_sample = self.first_sample_at - self.utterance_started
+
+    def cancel(self):
+        """Drop everything still buffered; the output goes silent on the next block"""
+        self.ring.clear()
+        self.ending = True
+        waiter, self.waiter = self.waiter, None
+        if waiter is not None:
+            self.resolve(waiter[2])
+
+    async def play(self, samples):
+        await self.play_stream(self.single(samples))
+
+    @staticmethod
+    async def single(samples):
+        yield samples
+
+    async def play_stream(self, buffer_stream):
+        self.begin()
+        try:
+            async for buffer in buffer_stream:
+                if buffer is None:
+                    break
+                await self.write(buffer)
+            await self.finish()
+        except BaseException:
+            self.cancel()
+            raise
+
+    def stats(self):
+        return {"underruns": self.underruns, "utterances": self.utterances,
+                "time_to_first_sample_ms": None if self.time_to_first_sample is None
+                else round(self.time_to_first_sample * 1000, 1)}
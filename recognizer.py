@@ -0,0 +1,229 @@
+import json
+import time
+import threading
+from collections import namedtuple
+
+from vad import EnergyEndpointer, BargeInDetector
+from commands import CommandSpotter
+
+# What ended a turn: kind is "ANSWER" or a command name, text what was said,
+# speech_end/asr_final perf_counter times for tracing, confidence the command
+# recognizer's confidence when it spotted the command (None otherwise), and
+# endpoint when trailing silence ended the turn (None otherwise)
+Turn = namedtuple("Turn", "kind text speech_end asr_final confidence endpoint", defaults=(None, None))
+
+
+class RecognizerPool:
+    """Kaldi recognizers built on one model, handed to one session at a time
+
+    acquire() returns a recognizer nobody else holds, freshly reset;
+    release() resets it and keeps it for the next session. Building a
+    recognizer allocates its decoding graph state, so reusing them makes
+    starting a session cheap. At most max_idle are kept between sessions.
+    """
+
+    def __init__(self, factory, max_idle=8):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+
+    def acquire(self):
+        with self.lock:
+            self.in_use += 1
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+        return self.factory()
+
+    def release(self, rec):
+        # The caller must be done decoding with it; a reset here means no
+        # audio from one session can show up in the next
+        rec.Reset()
+        with self.lock:
+            self.in_use -= 1
+            if len(self.idle) < self.max_idle:
+                self.idle.append(rec)
+
+    def stats(self):
+        with self.lock:
+            return {"recognizers_created": self.created, "recognizers_in_use": self.in_use,
+                    "recognizers_idle": len(self.idle)}
+
+
+class TurnRecognizer:
+    """Turns microphone blocks into finished turns for one conversation
+
+    Wraps a Kaldi recognizer with the energy endpointer, the command spotter
+    and the barge-in detector. process() is synchronous and keeps no thread
+    of its own, so the caller decides where decoding runs.
+
+    command_rec, if given, is a second Kaldi recognizer restricted to the
+    command grammar (commands.command_grammar) with word results enabled.
+    It decodes the same blocks; since its search space is only the command
+    phrases, its results come quickly and carry a usable confidence. Commands
+    it reports with at least command_min_confidence end the turn at once.
+    The open-vocabulary transcript still supplies the answer text.
+
+    self.speculation is the best guess of the finished answer so far, for
+    starting on a reply early: set when the hand-over phrase first shows up
+    in a partial result (before it is stable enough to end the turn), and
+    when the user has paused for speculate_after_silence_ms (0 turns pause
+    guesses off). It is None until there is a guess.
+    """
+
+    def __init__(self, rec, matcher, sample_rate, trailing_silence_ms=1500, max_utterance_ms=30000,
+                 stable_partials=2, barge_in_min_speech_ms=300, barge_in_echo_ratio=0.5,
+                 command_rec=None, command_min_confidence=0.8, speculate_after_silence_ms=0):
+        self.rec = rec
+        self.command_rec = command_rec
+        self.command_min_confidence = command_min_confidence
+        self.matcher = matcher
+        self.spotter = CommandSpotter(matcher, stable_partials)
+        self.endpointer = EnergyEndpointer(sample_rate,
+                                           trailing_silence_ms=trailing_silence_ms,
+                                           max_utterance_ms=max_utterance_ms)
+        self.barge_in = BargeInDetector(self.endpointer,
+                                        min_speech_ms=barge_in_min_speech_ms,
+                                        echo_ratio=barge_in_echo_ratio)
+        self.speculate_after_silence_ms = speculate_after_silence_ms
+        self.user_input_string = ""
+        self.partial = ""
+        self.speculation = None
+
+    def reset(self):
+        """Start a new turn, forgetting anything heard before"""
+        self.rec.Reset()
+        if self.command_rec is not None:
+            self.command_rec.Reset()
+        self.endpointer.reset()
+        self.barge_in.reset()
+        self.spotter.reset()
+        self.user_input_string = ""
+        self.partial = ""
+        self.speculation = None
+
+    def watch_barge_in(self, block, playback_level):
+        """True once the user has been talking over playback long enough"""
+        return self.barge_in.process(block, playback_level)
+
+    def process(self, block):
+        """Decode one block; returns a Turn when the turn is over, otherwise None
+
+        The latest partial transcript is left in self.partial.
+        """
+        decode, endpoint = self.endpointer.process(block)
+
+        # Silent blocks are skipped so the recognizer doesn't decode them
+        if decode:
+            audio = bytes(block)  # Kaldi takes bytes; only blocks that are decoded are copied
+            if self.command_rec is not None and self.command_rec.AcceptWaveform(audio):
+                turn = self.grammar_command(json.loads(self.command_rec.Result()), audio)
+                if turn is not None:
+                    return turn
+            if self.rec.AcceptWaveform(audio):
+                result = json.loads(self.rec.Result())
+                turn = self.handle_text(result.get("text", ""))
+                if turn is not None:
+                    return turn
+            else:
+                self.partial = json.loads(self.rec.PartialResult()).get("partial", "")
+
+                # Act on commands without waiting for the utterance to finish
+                match = self.spotter.feed_partial(self.partial)
+                if match is not None:
+                    self.rec.Reset()
+                    now = time.perf_counter()
+                    return self.command_turn(match, self.partial, now, now)
+                candidate = self.spotter.candidate
+                if candidate is not None and candidate[0] == "END_TURN":
+                    # Heard once, not yet stable: what comes before it is probably the answer
+                    before = " ".join(self.partial.split()[:candidate[1]])
+                    self.speculation = f"{self.user_input_string}{before}".strip() or None
+
+        if endpoint:
+            # Flush whatever the recognizer still holds and end the turn on silence.
+            # The user stopped talking when the trailing silence began, not now
+            endpoint_at = time.perf_counter()
+            speech_end = endpoint_at - self.endpointer.silence_ms / 1000
+            if self.command_rec is not None:
+                turn = self.grammar_command(json.loads(self.command_rec.FinalResult()))
+                if turn is not None:
+                    return turn._replace(speech_end=speech_end, endpoint=endpoint_at)
+            result = json.loads(self.rec.FinalResult())
+            turn = self.handle_text(result.get("text", ""), speech_end)
+            if turn is not None:
+                return turn._replace(endpoint=endpoint_at)
+            if self.user_input_string.strip():
+                return Turn("ANSWER", self.user_input_string.strip(), speech_end, time.perf_counter(),
+                            endpoint=endpoint_at)
+            # Nothing was recognized (a cough, background noise); keep listening
+            self.endpointer.reset()
+        elif (self.speculate_after_silence_ms and self.endpointer.in_speech and self.spotter.candidate is None
+              and self.endpointer.silence_ms >= self.speculate_after_silence_ms):
+            # A pause that may turn into the end of the turn
+            self.speculation = f"{self.user_input_string}{self.partial}".strip() or self.speculation
+        return None
+
+    def grammar_command(self, result, block=None):
+        """A Turn for a command the grammar recognizer is confident of, else None
+
+        block is the audio just given to the command recognizer; the main
+        recognizer gets it too before its transcript is read.
+        """
+        match = self.matcher.search(result.get("text", ""))
+        if match is None:
+            return None
+        words = result.get("result", [])[match.start:match.end]
+        confidence = min((word.get("conf", 1.0) for word in words), default=1.0)
+        if confidence < self.command_min_confidence:
+            return None  # Leave it to the open-vocabulary transcript
+
+        now = time.perf_counter()
+        if match.command != "END_TURN":
+            self.rec.Reset()
+            return Turn(match.command, match.phrase, now, now, confidence)
+
+        # The answer is what the main recognizer heard, less the hand-over phrase
+        # (or as much of it as it has decoded so far), so it isn't counted twice
+        if block is not None:
+            self.rec.AcceptWaveform(block)
+        heard = json.loads(self.rec.FinalResult()).get("text", "").split()
+        phrase = match.phrase.lower().split()
+        full = self.matcher.search(" ".join(heard))
+        if full is not None and full.command == "END_TURN":
+            heard = heard[:full.start]
+        else:
+            for length in range(min(len(phrase), len(heard)), 0, -1):
+                if [word.lower() for word in heard[-length:]] == phrase[:length]:
+                    heard = heard[:-length]
+                    break
+        answer = f"{self.user_input_string}{' '.join(heard)}".strip()
+        return Turn("ANSWER", answer, now, now, confidence)
+
+    def handle_text(self, text, speech_end=None):
+        """Add a final transcript to the turn; returns a Turn if it held a command"""
+        text = text.strip()
+
+        # The next partial result belongs to a new utterance
+        self.spotter.reset()
+        self.partial = ""
+
+        match = self.matcher.search(text)
+        if match is not None:
+            now = time.perf_counter()
+            return self.command_turn(match, text, speech_end or now, now)
+
+        if text:
+            self.user_input_string += text + " "
+        return None
+
+    def command_turn(self, match, text, speech_end, asr_final):
+        if match.command == "END_TURN":
+            # Keep whatever was said before the hand-over phrase
+            before = " ".join(text.split()[:match.start])
+            answer = f"{self.user_input_string}{before}".strip()
+            return Turn("ANSWER", answer, speech_end, asr_final)
+        return Turn(match.command, match.phrase, speech_end, asr_final)
@@ -0,0 +1,162 @@
+import time
+import random
+import asyncio
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service that has been failing"""
+
+
+def is_retryable(error):
+    """Timeouts, dropped connections, rate limits and server errors are worth another try"""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    # openai's connection and timeout errors carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class CircuitBreaker:
+    """Stops calling a service after repeated failures, then lets one trial call through
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail at once with CircuitOpenError. Once reset_seconds have passed, one
+    call is allowed; its success closes the circuit, its failure reopens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def before_call(self):
+        if self.opened_at is None:
+            return
+        if self.trial_running or time.monotonic() - self.opened_at < self.reset_seconds:
+            raise CircuitOpenError(f"{self.name} is unavailable after {self.failures} failures")
+        self.trial_running = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.trial_running else "open"
+
+
+class Retrier:
+    """Runs calls with a per-attempt deadline and jittered exponential backoff
+
+    call(make_call) awaits make_call() up to `attempts` times. Each attempt
+    is cut off after `timeout` seconds, and retryable failures are retried
+    after a random delay of up to base_delay * 2**n (at most max_delay), the
+    "full jitter" schedule that keeps many clients from retrying in step.
+    Every attempt goes through the breaker, which only counts retryable
+    failures: a 400 or 401 is a bug or bad configuration, not an outage.
+    """
+
+    def __init__(self, breaker, attempts=3, timeout=10.0, base_delay=0.25, max_delay=2.0):
+        self.breaker = breaker
+        self.attempts = attempts
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.timeouts = 0
+
+    async def call(self, make_call, timeout=None, deadline=None):
+        """Result of make_call(); timeout overrides the per-attempt limit,
+        deadline bounds all attempts together (seconds from now)"""
+        timeout = timeout or self.timeout
+        give_up_at = None if deadline is None else time.monotonic() + deadline
+        for attempt in range(self.attempts):
+            self.breaker.before_call()
+            limit = timeout if give_up_at is None else min(timeout, give_up_at - time.monotonic())
+            try:
+                result = await asyncio.wait_for(make_call(), max(0.0, limit))
+            except asyncio.CancelledError:
+                self.breaker.trial_running = False
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The service answered; a bad request says nothing about its health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                out_of_time = give_up_at is not None and time.monotonic() + delay >= give_up_at
+                if attempt == self.attempts - 1 or out_of_time:
+                    raise
+                self.retries += 1
+                print(f"{self.breaker.name} call failed ({type(e).__name__}: {e}); retrying in {delay:.2f} s")
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    def stats(self):
+        return {"state": self.breaker.state, "retries": self.retries, "timeouts": self.timeouts}
+
+
+class LatencyTracker:
+    """Recent latencies of one kind of call, for picking a hedging delay"""
+
+    def __init__(self, default, window=100, min_samples=10):
+        self.default = default
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if len(self.samples) < self.min_samples:
+            return self.default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def hedged(make_call, delay, hedges=1):
+    """Start make_call(); if it hasn't finished after delay seconds, start another
+
+    Returns the first successful result and cancels the rest. A request that
+    fails early doesn't wait for the delay: the hedge starts at once. If every
+    request fails, the first error is raised.
+    """
+    pending = {asyncio.ensure_future(make_call())}
+    errors = []
+    launched = 1
+    try:
+        while pending:
+            wait = delay if launched <= hedges else None
+            done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                errors.append(task.exception())
+            if launched <= hedges and (not done or not pending):
+                # Too slow, or failed with nothing else running: send a duplicate
+                pending.add(asyncio.ensure_future(make_call()))
+                launched += 1
+        raise errors[0]
+    finally:
+        for task in pending:
+            task.cancel()
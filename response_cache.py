@@ -0,0 +1,125 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+PUNCTUATION = re.compile(r"[^\w\s']")
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse spaces, so trivially different inputs match"""
+    return " ".join(PUNCTUATION.sub(" ", text.lower()).split())
+
+
+class ResponseCache:
+    """Persistent cache of LLM replies in SQLite, with a time-to-live and a size budget
+
+    Keys cover the model, the conversation so far and the user's input, all
+    normalised, so a hit is a reply to the same question in the same
+    context. Each entry keeps the sentences the reply was spoken as, so
+    replaying it asks TTS for exactly the same text and hits the speech
+    cache. Least recently used entries are evicted once the replies stored
+    exceed max_bytes; max_bytes=0 turns the cache off.
+    """
+
+    def __init__(self, path, max_bytes, ttl_seconds):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+        self.db = None
+        self.total_bytes = 0
+        if max_bytes > 0:
+            self.open()
+
+    def open(self):
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        # Cheap commits: the cache can lose its last few writes in a crash, nothing worse
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS replies (
+                               key TEXT PRIMARY KEY, sentences TEXT NOT NULL, size INTEGER NOT NULL,
+                               created REAL NOT NULL, last_used REAL NOT NULL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS replies_last_used ON replies (last_used)")
+        self.db.execute("DELETE FROM replies WHERE created < ?", (time.time() - self.ttl_seconds,))
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, messages, user_input):
+        """Hash the model, the conversation before the input, and the input"""
+        history = [[m["role"], normalize(m["content"])] for m in messages]
+        payload = json.dumps([model, history, normalize(user_input)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """The cached reply's sentences, or None on a miss"""
+        if self.db is None:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT sentences, size, created FROM replies WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[2] > self.ttl_seconds:
+                self.db.execute("DELETE FROM replies WHERE key = ?", (key,))
+                self.db.commit()
+                self.total_bytes -= row[1]
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE replies SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def contains(self, key):
+        """Whether get() would hit, without counting a lookup"""
+        if self.db is None:
+            return False
+        with self.lock:
+            row = self.db.execute("SELECT created FROM replies WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl_seconds
+
+    def put(self, key, sentences):
+        """Store a reply, as the sentences it was spoken in, and evict over the size budget"""
+        if self.db is None or not sentences:
+            return
+        data = json.dumps(sentences, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            old = self.db.execute("SELECT size FROM replies WHERE key = ?", (key,)).fetchone()
+            self.total_bytes += size - (old[0] if old else 0)
+            self.db.execute("INSERT OR REPLACE INTO replies VALUES (?, ?, ?, ?, ?)", (key, data, size, now, now))
+
+            while self.total_bytes > self.max_bytes:
+                oldest = self.db.execute("SELECT key, size FROM replies WHERE key != ? "
+                                         "ORDER BY last_used LIMIT 1", (key,)).fetchone()
+                if oldest is None:
+                    break
+                self.db.execute("DELETE FROM replies WHERE key = ?", (oldest[0],))
+                self.total_bytes -= oldest[1]
+                self.evicted += 1
+            self.db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired, "evicted": self.evicted, "bytes": self.total_bytes}
+
+    def close(self):
+        if self.db is not None:
+            with self.lock:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,304 @@
+"""Multi-user server: one practice session per WebSocket connection
+
+    python server.py --port 8766
+
+Clients send 16 kHz mono int16 microphone audio as binary frames, and may
+send JSON text frames: {"type": "text", "text": ...} to type an answer.
+A first frame of {"type": "hello", "learner": ID} keeps word progress for
+that learner across sessions (ID is 1-64 letters, digits, "_", "-" or
+"."); without it, progress lasts only as long as the connection.
+The server sends JSON events ({"type": "state" | "partial" | "user_text" |
+"reply_text" | "error", ...}) and the spoken audio as binary frames of
+24 kHz mono int16 PCM. GET /stats returns load figures as JSON.
+
+Every session has its own Kaldi recognizer built on the one shared Vosk
+model, and decoding for all sessions runs on a pool of threads sized to
+the CPU count (Vosk releases the GIL while decoding).
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+
+import engine
+from engine import ConversationEngine, EngineEvents, runtime, tracer
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8766"))
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", str(os.cpu_count() or 1)))
+
+# Admission control: refuse new sessions past this count, or while decoding is backed up
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", str(4 * DECODE_WORKERS)))
+ADMIT_MAX_DECODE_LAG_MS = float(os.getenv("ADMIT_MAX_DECODE_LAG_MS", "250"))
+
+# Per-session backpressure: stop reading a client's audio once this many blocks
+# (engine.BLOCK_SIZE samples each) wait to be decoded
+MAX_AUDIO_BACKLOG = int(os.getenv("MAX_AUDIO_BACKLOG", "8"))
+
+BUSY_CLOSE_CODE = 1013  # "Try again later"
+INVALID_CLOSE_CODE = 1008  # "Policy violation"
+
+# Seconds to wait for a client's first frame, which may say who the learner is
+HELLO_TIMEOUT = float(os.getenv("HELLO_TIMEOUT", "1"))
+
+
+class DecodePool:
+    """Thread pool shared by every session's recognizer, with load statistics
+
+    lag is a moving average of how long a block waits for a free thread;
+    real_time_factor is decoding time over audio time across all sessions.
+    backlog() is the decoding queued or running right now, per thread, so
+    it falls back to zero as soon as the sessions go quiet.
+    """
+
+    def __init__(self, workers, sample_rate):
+        self.workers = workers
+        self.sample_rate = sample_rate
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="decode")
+        self.lag = 0.0
+        self.in_flight = 0  # Blocks submitted and not yet decoded
+        self.busy_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.blocks = 0
+
+    async def run(self, fn, block):
+        queued = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = fn(block)
+            return result, started, time.perf_counter()
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            result, started, finished = await loop.run_in_executor(self.executor, timed)
+        finally:
+            self.in_flight -= 1
+        self.lag = 0.9 * self.lag + 0.1 * (started - queued)
+        self.busy_seconds += finished - started
+        self.audio_seconds += len(block) / self.sample_rate  # An int16 sample array
+        self.blocks += 1
+        return result
+
+    def backlog(self):
+        """Seconds of decoding waiting or running per thread, at the mean time per block"""
+        if not self.blocks:
+            return 0.0
+        return self.in_flight / self.workers * self.busy_seconds / self.blocks
+
+    def stats(self):
+        return {"decode_workers": self.workers,
+                "decode_lag_ms": round(self.lag * 1000, 1),
+                "decode_backlog_ms": round(self.backlog() * 1000, 1),
+                "real_time_factor": round(self.busy_seconds / self.audio_seconds, 3) if self.audio_seconds else 0.0,
+                "blocks_decoded": self.blocks}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+class Client:
+    """One connection's outgoing side: messages are sent in order, one at a time"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = asyncio.Lock()
+
+    async def send(self, message):
+        async with self.lock:
+            await self.connection.send(message)
+
+    def send_soon(self, payload):
+        """Queue a JSON event without waiting; order is kept by the lock"""
+        asyncio.create_task(self.send_quietly(json.dumps(payload)))
+
+    async def send_quietly(self, message):
+        try:
+            await self.send(message)
+        except Exception:
+            pass  # The connection closed; the session is being torn down
+
+
+class ClientEvents(EngineEvents):
+    def __init__(self, client):
+        self.client = client
+
+    def on_state(self, state, word):
+        self.client.send_soon({"type": "state", "state": state, "word": word})
+
+    def on_partial(self, text):
+        self.client.send_soon({"type": "partial", "text": text})
+
+    def on_user_text(self, text):
+        self.client.send_soon({"type": "user_text", "text": text})
+
+    def on_reply_text(self, text):
+        self.client.send_soon({"type": "reply_text", "text": text})
+
+    def on_error(self, message):
+        self.client.send_soon({"type": "error", "message": message})
+
+
+class ClientPlayer:
+    """Sends speech to the client, taking as long as the client will take to play it
+
+    The engine treats playback as finished when this returns, so it keeps
+    to the speaker's pace instead of returning as soon as the bytes are sent.
+    """
+
+    def __init__(self, client, sample_rate=engine.TTS_SAMPLE_RATE):
+        self.client = client
+        self.sample_rate = sample_rate
+
+    async def play(self, samples):
+        started = time.perf_counter()
+        await self.client.send(samples.tobytes())
+        await asyncio.sleep(max(0.0, len(samples) / self.sample_rate - (time.perf_counter() - started)))
+
+    async def play_stream(self, buffer_stream):
+        started = None
+        sent = 0
+        async for buffer in buffer_stream:
+            if buffer is None:
+                break
+            if started is None:
+                started = time.perf_counter()
+            await self.client.send(buffer.tobytes())
+            sent += len(buffer)
+        if started is not None:
+            await asyncio.sleep(max(0.0, sent / self.sample_rate - (time.perf_counter() - started)))
+
+
+class PracticeServer:
+    def __init__(self, decode_workers=DECODE_WORKERS, max_sessions=MAX_SESSIONS,
+                 admit_max_lag_ms=ADMIT_MAX_DECODE_LAG_MS, max_backlog=MAX_AUDIO_BACKLOG):
+        self.pool = DecodePool(decode_workers, engine.SAMPLE_RATE)
+        self.max_sessions = max_sessions
+        self.admit_max_lag = admit_max_lag_ms / 1000
+        self.max_backlog = max_backlog
+        self.sessions = set()
+        self.admitted = 0
+        self.rejected = 0
+
+    def stats(self):
+        return {"sessions": len(self.sessions), "max_sessions": self.max_sessions,
+                "admitted": self.admitted, "rejected": self.rejected,
+                "cpu_count": os.cpu_count(),
+                "dropped_blocks": sum(session.dropped_blocks for session in self.sessions),
+                **self.pool.stats(), **engine.recognizers.stats(),
+                "llm": engine.llm_calls.stats(), "tts": engine.tts_calls.stats(),
+                "response_cache": engine.response_cache.stats(),
+                "session_log": engine.session_log.stats(),
+                "scheduler": engine.scheduler_stats.stats()}
+
+    def admission_error(self):
+        if len(self.sessions) >= self.max_sessions:
+            return "server full"
+        if self.sessions and self.pool.backlog() > self.admit_max_lag:
+            return "decoding is behind"
+        return None
+
+    def process_request(self, connection, request):
+        """Answer GET /stats over plain HTTP; everything else is a WebSocket upgrade"""
+        if request.path == "/stats":
+            return connection.respond(HTTPStatus.OK, json.dumps(self.stats()) + "\n")
+        return None
+
+    async def handle(self, connection):
+        reason = self.admission_error()
+        if reason is not None:
+            self.rejected += 1
+            await connection.send(json.dumps({"type": "error", "message": f"Busy: {reason}"}))
+            await connection.close(BUSY_CLOSE_CODE, reason)
+            return
+
+        # The learner, if the client says who it is, before the first word is picked
+        try:
+            first = await asyncio.wait_for(connection.recv(), HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            first = None  # A client that waits to hear the first word; recv() is safe to cancel
+        except Exception:
+            return
+        learner = ""
+        if isinstance(first, str):
+            request = json.loads(first)
+            if request.get("type") == "hello":
+                learner = str(request.get("learner", ""))
+                if learner and not engine.LEARNER_ID.fullmatch(learner):
+                    await connection.send(json.dumps({"type": "error", "message": "Invalid learner id"}))
+                    await connection.close(INVALID_CLOSE_CODE, "invalid learner id")
+                    return
+                first = None
+
+        self.admitted += 1
+        client = Client(connection)
+        session = ConversationEngine(ClientEvents(client), player_factory=lambda: ClientPlayer(client),
+                                     decode_pool=self.pool, max_audio_blocks=self.max_backlog,
+                                     learner=learner)
+        self.sessions.add(session)
+        run_task = asyncio.create_task(session.run())
+        try:
+            if first is not None:
+                await self.deliver(session, first)
+            async for message in connection:
+                if run_task.done():
+                    break
+                await self.deliver(session, message)
+        except Exception as e:
+            print(f"Session error: {e}")
+        finally:
+            self.sessions.discard(session)
+            session.close()
+            try:
+                await asyncio.wait_for(run_task, 5)
+            except Exception:
+                run_task.cancel()
+
+    @staticmethod
+    async def deliver(session, message):
+        if isinstance(message, bytes):
+            # Waits while this session's backlog is full, which stops reading
+            # from the socket and pushes back on the client
+            await session.push_audio(message)
+        else:
+            request = json.loads(message)
+            if request.get("type") == "text":
+                session.submit_text_now(request.get("text", ""))
+
+    async def serve(self, host, port):
+        from websockets.asyncio.server import serve
+        async with serve(self.handle, host, port, process_request=self.process_request,
+                         max_size=2 ** 20) as server:
+            print(f"Serving practice sessions on ws://{host}:{port} "
+                  f"({self.pool.workers} decode threads, up to {self.max_sessions} sessions)")
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve practice sessions over WebSockets")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--decode-workers", type=int, default=DECODE_WORKERS)
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    args = parser.parse_args()
+
+    server = PracticeServer(args.decode_workers, args.max_sessions)
+    # Load the shared model before accepting anyone
+    engine.prepare_shared_resources()
+    try:
+        runtime.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.pool.shutdown()
+        engine.session_log.close()
+        tracer.close()
+        runtime.stop()
+
+
+if __name__ == "__main__":
+    main()
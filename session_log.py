@@ -0,0 +1,325 @@
+"""Session logs for quality review: what was said in every turn, and the microphone audio
+
+Turn records (words, answers, replies, commands, errors) are appended to a
+SQLite database by a background writer, in batches. The audio the
+recognizer heard is copied into memory-mapped segment files of a fixed
+length, indexed in the same database; each answer record points at its span.
+
+    python session_log.py [log dir] [--session ID] [--wav OUT_DIR]
+
+prints a session's transcript (the latest by default) and can write each
+spoken answer to a WAV file.
+"""
+import os
+import sys
+import mmap
+import time
+import uuid
+import wave
+import queue
+import sqlite3
+import argparse
+import threading
+import numpy as np
+
+from batch_writer import BatchWriter
+
+DATABASE = "sessions.sqlite"
+WAKE = "wake"  # Queued after a segment fills, so the writer replaces it promptly
+
+
+class AudioSegment:
+    """A preallocated file of int16 samples, written through a memory map"""
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.start = None  # Session sample index of the first sample, set once in use
+        self.used = 0
+        self.file = open(path, "w+b")
+        self.file.truncate(capacity * 2)
+        self.map = mmap.mmap(self.file.fileno(), capacity * 2)
+        self.samples = np.frombuffer(self.map, dtype=np.int16)
+
+    def close(self):
+        """Flush, trim the unused tail and unmap"""
+        self.samples = None  # Release the buffer so the map can close
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(self.used * 2)
+        self.file.close()
+
+
+class SessionRecorder:
+    """One session's log, used from the event loop
+
+    record() only queues a row, and write_audio() only copies a block into
+    the current memory-mapped segment; opening, flushing and closing
+    segments happen on the log's writer thread. A full segment is swapped
+    for a spare the writer prepared; if the writer hasn't caught up and
+    there is no spare, audio is dropped and counted rather than waited for.
+    """
+
+    def __init__(self, log, session_id, audio):
+        self.log = log
+        self.id = session_id
+        self.audio = audio
+        self.position = 0   # Samples logged so far; answers' audio spans index into this
+        self.segment = None
+        self.spare = None
+        self.retired = []   # Segments for the writer to close
+        self.next_segment = 0
+        self.closed = False
+        self.lock = threading.Lock()  # Held briefly by the writer to hand over segments
+
+    def record(self, kind, word=None, text=None, audio=None, confidence=None):
+        """Log one event; audio is a (start, count) span of this session's samples"""
+        if self.closed:
+            return
+        start, count = audio if audio and audio[1] else (None, None)
+        self.log.write((self.id, time.time(), kind, word, text, start, count, confidence))
+
+    def write_audio(self, block):
+        if not self.audio:
+            return
+        with self.lock:
+            samples = block
+            while len(samples) and not self.closed:
+                if self.segment is None or self.segment.used == self.segment.capacity:
+                    if not self.rotate():
+                        self.log.dropped_blocks += 1
+                        return
+                segment = self.segment
+                count = min(len(samples), segment.capacity - segment.used)
+                segment.samples[segment.used:segment.used + count] = samples[:count]
+                segment.used += count
+                self.position += count
+                samples = samples[count:]
+
+    def rotate(self):
+        """Swap the full segment for the spare; False if the writer hasn't made one yet"""
+        if self.segment is not None:
+            self.retired.append(self.segment)
+        self.segment, self.spare = self.spare, None
+        self.log.wake()
+        if self.segment is None:
+            return False
+        self.segment.start = self.position
+        return True
+
+    def close(self):
+        """Hand the open segments to the writer; later audio and records are ignored"""
+        with self.lock:
+            if self.closed:
+                return
+            self.record("end")
+            self.closed = True
+            self.retired.extend(s for s in (self.segment, self.spare) if s is not None)
+            self.segment = self.spare = None
+        self.log.wake()
+
+
+class SessionLog(BatchWriter):
+    """Background writer for every session's records and audio segments
+
+    Each batch of records is committed in one transaction, after which the
+    writer looks after the audio segments. audio=False logs text only.
+    """
+
+    def __init__(self, directory, enabled=True, audio=True, sample_rate=16000, segment_seconds=60,
+                 max_audio_bytes=0, max_pending=1000, flush_interval=1.0):
+        super().__init__(enabled and bool(directory), max_pending, flush_interval)
+        self.directory = directory
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.segment_samples = int(sample_rate * segment_seconds)
+        self.max_audio_bytes = max_audio_bytes  # Oldest segments are deleted beyond this; 0 keeps all
+        self.db = None
+        self.recorders = []
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.records = 0
+        self.dropped_blocks = 0
+        self.segments = 0
+        self.audio_samples = 0
+
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+        self.start_writer("session-log")
+
+    def open_session(self):
+        recorder = SessionRecorder(self, uuid.uuid4().hex[:12], self.enabled and self.audio)
+        if self.enabled:
+            with self.lock:
+                self.recorders.append(recorder)
+            self.wake()  # Have the first segment ready before the user speaks
+        return recorder
+
+    def wake(self):
+        if not self.enabled:
+            return
+        try:
+            self.pending.put_nowait(WAKE)
+        except queue.Full:
+            pass  # The writer is busy and will look at the segments after this batch
+
+    # Writer thread
+
+    def connect(self):
+        db = sqlite3.connect(os.path.join(self.directory, DATABASE))
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("""CREATE TABLE IF NOT EXISTS events (
+                          session TEXT NOT NULL, time REAL NOT NULL, kind TEXT NOT NULL, word TEXT,
+                          text TEXT, audio_start INTEGER, audio_samples INTEGER, confidence REAL)""")
+        db.execute("""CREATE TABLE IF NOT EXISTS audio_segments (
+                          session TEXT NOT NULL, file TEXT NOT NULL, start INTEGER NOT NULL,
+                          samples INTEGER NOT NULL, sample_rate INTEGER NOT NULL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS events_session ON events (session, time)")
+        db.commit()
+        return db
+
+    def open_writer(self):
+        try:
+            self.db = self.connect()
+        except sqlite3.Error as e:
+            print(f"Could not open the session log: {e}")
+            return False
+        return True
+
+    def write_batch(self, items, stop):
+        rows = [item for item in items if isinstance(item, tuple)]
+        try:
+            if rows:
+                with self.db:
+                    self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self.records += len(rows)
+            self.maintain(self.db, stop)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Could not write the session log: {e}")
+        if stop:
+            self.db.close()
+
+    def maintain(self, db, stop=False):
+        """Close retired segments, prepare spares and keep audio under its budget"""
+        with self.lock:
+            recorders = list(self.recorders)
+        closed_any = False
+        for recorder in recorders:
+            if stop:
+                recorder.close()
+            with recorder.lock:
+                retired, recorder.retired = recorder.retired, []
+                wants_spare = recorder.audio and not recorder.closed and recorder.spare is None
+            for segment in retired:
+                segment.close()
+                if segment.start is None:
+                    os.remove(segment.path)  # A spare that was never used
+                    continue
+                with db:
+                    db.execute("INSERT INTO audio_segments VALUES (?, ?, ?, ?, ?)",
+                               (recorder.id, os.path.basename(segment.path), segment.start,
+                                segment.used, self.sample_rate))
+                self.segments += 1
+                self.audio_samples += segment.used
+                closed_any = True
+            if wants_spare:
+                path = os.path.join(self.directory, f"{recorder.id}-{recorder.next_segment:04d}.pcm")
+                recorder.next_segment += 1
+                spare = AudioSegment(path, self.segment_samples)
+                with recorder.lock:
+                    if recorder.closed:
+                        recorder.retired.append(spare)
+                    else:
+                        recorder.spare = spare
+            if recorder.closed and not recorder.retired:
+                with self.lock:
+                    self.recorders.remove(recorder)
+        if closed_any and self.max_audio_bytes:
+            self.trim_audio(db)
+
+    def trim_audio(self, db):
+        """Delete the oldest closed segments until the audio fits in max_audio_bytes"""
+        rows = db.execute("SELECT rowid, file, samples FROM audio_segments ORDER BY rowid").fetchall()
+        total = sum(samples * 2 for _, _, samples in rows)
+        for rowid, name, samples in rows:
+            if total <= self.max_audio_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            with db:
+                db.execute("DELETE FROM audio_segments WHERE rowid = ?", (rowid,))
+            total -= samples * 2
+
+    def stats(self):
+        return {"records": self.records, "dropped_records": self.dropped,
+                "dropped_audio_blocks": self.dropped_blocks, "segments": self.segments,
+                "audio_seconds": round(self.audio_samples / self.sample_rate, 1)}
+
+    def close(self, timeout=5):
+        """Close every session's segments, flush pending records and stop the writer"""
+        super().close(timeout)
+
+
+def read_audio(db, directory, session, start, count):
+    """Samples [start, start + count) of a session, from whichever segments are still on disk"""
+    out = np.zeros(count, dtype=np.int16)
+    rows = db.execute("SELECT file, start, samples FROM audio_segments WHERE session = ? "
+                      "AND start < ? AND start + samples > ? ORDER BY start",
+                      (session, start + count, start)).fetchall()
+    for name, first, samples in rows:
+        try:
+            data = np.fromfile(os.path.join(directory, name), dtype=np.int16)
+        except FileNotFoundError:
+            continue
+        lo, hi = max(start, first), min(start + count, first + samples)
+        out[lo - start:hi - start] = data[lo - first:hi - first]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a logged session's transcript")
+    parser.add_argument("directory", nargs="?", default="session_logs")
+    parser.add_argument("--session", help="session id (default: the latest)")
+    parser.add_argument("--wav", help="write each spoken answer to a WAV file in this directory")
+    args = parser.parse_args()
+
+    path = os.path.join(args.directory, DATABASE)
+    if not os.path.exists(path):
+        print(f"No session log at {path}")
+        sys.exit(1)
+    db = sqlite3.connect(path)
+    session = args.session or (db.execute("SELECT session FROM events ORDER BY time DESC LIMIT 1").fetchone() or [None])[0]
+    rows = db.execute("SELECT time, kind, word, text, audio_start, audio_samples, confidence FROM events "
+                      "WHERE session = ? ORDER BY time", (session,)).fetchall()
+    if not rows:
+        print(f"No events for session {session}")
+        sys.exit(1)
+    print(f"Session {session}")
+    rate = (db.execute("SELECT sample_rate FROM audio_segments WHERE session = ? LIMIT 1",
+                       (session,)).fetchone() or [16000])[0]
+    if args.wav:
+        os.makedirs(args.wav, exist_ok=True)
+    for n, (at, kind, word, text, start, count, confidence) in enumerate(rows):
+        line = f"{time.strftime('%H:%M:%S', time.localtime(at))} {kind:<8}"
+        if kind == "word":
+            line += f"[{word}] "
+        line += text or ""
+        if confidence is not None:
+            line += f" (confidence {confidence:.2f})"
+        if count:
+            line += f" [{count / rate:.1f} s audio]"
+            if args.wav:
+                with wave.open(os.path.join(args.wav, f"{session}-{n:03d}.wav"), "wb") as out:
+                    out.setnchannels(1)
+                    out.setsampwidth(2)
+                    out.setframerate(rate)
+                    out.writeframes(read_audio(db, args.directory, session, start, count).tobytes())
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
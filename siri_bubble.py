@@ -1,12 +1,25 @@
 import sys
-import random
-import math
-from PySide6.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, Property, QPoint, Signal, Slot
-from PySide6.QtGui import QPainter, QColor, QPainterPath, QBrush, QPen
+import numpy as np
+from PySide6.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, Property, QPoint, QRect, Signal, Slot
+from PySide6.QtGui import QPainter, QColor, QPainterPath, QBrush, QPen, QPixmap
 from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel
 
+# Frame intervals: while animating, and while the bars have stopped moving (e.g. a silent microphone)
+FRAME_MS = 50
+PROCESSING_FRAME_MS = 70
+STILL_FRAME_MS = 250
+STILL_FRAMES = 10  # Unchanged frames before dropping to STILL_FRAME_MS
+
+PULSE_STEP = 0.15  # Radians the processing pulse advances per frame
+
 class VoiceWaveform(QWidget):
-    """Widget that displays animated voice waveforms similar to Siri"""
+    """Widget that displays animated voice waveforms similar to Siri
+
+    Bar heights are NumPy arrays, and the processing pulse is a table
+    computed once. Only the bar area is repainted, and only when a bar's
+    drawn height changes. The timer slows down once the bars are still
+    and stops while the widget is hidden.
+    """
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -16,12 +29,24 @@ class VoiceWaveform(QWidget):
         self.waveform_height = 40
         self.num_bars = 20
         self.bar_spacing = 4
-        self.bars = [0] * self.num_bars
-        self.target_heights = [0] * self.num_bars
+        self.bars = np.zeros(self.num_bars, dtype=np.float32)
+        self.target_heights = np.zeros(self.num_bars, dtype=np.float32)
+        self.painted = np.zeros(self.num_bars, dtype=np.int32)  # Heights on screen
+        self.even_bars = np.arange(self.num_bars) % 2 == 0
+        self.rng = np.random.default_rng()
+        
+        # One full cycle of the processing pulse: a sine wave travelling once around the bars
+        steps = int(round(2 * np.pi / PULSE_STEP))
+        phases = (np.arange(steps)[:, None] / steps + np.arange(self.num_bars)[None, :] / self.num_bars) * 2 * np.pi
+        self.pulse_table = (5 + (np.sin(phases) + 1) / 2 * (self.waveform_height - 10)).astype(np.float32)
+        self.pulse_frame = 0
+        self.level_index = None  # Which meter band feeds each bar, for the meter's band count
         
         # Animation timer
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_waveform)
+        self.frame_ms = FRAME_MS
+        self.still_frames = 0
         
         # States
         self.is_listening = False
@@ -35,8 +60,37 @@ class VoiceWaveform(QWidget):
         self.idle_color = QColor(142, 142, 147)     # Gray
         
         self.current_color = self.idle_color
-        self._pulse_phase = 0
         
+        # Optional level meters for real microphone and playback audio
+        self.input_meter = None
+        self.output_meter = None
+        
+    def set_level_meters(self, input_meter, output_meter):
+        """Drive the listening and speaking bars from real audio levels"""
+        self.input_meter = input_meter
+        self.output_meter = output_meter
+    
+    def follow_levels(self, levels, smoothing):
+        """Move the bars toward measured levels (values from 0 to 1)"""
+        if self.level_index is None or self.level_index[1] != len(levels):
+            self.level_index = (np.arange(self.num_bars) * len(levels) // self.num_bars, len(levels))
+        self.target_heights = 5 + np.asarray(levels, dtype=np.float32)[self.level_index[0]] * (self.waveform_height - 5)
+        self.bars += (self.target_heights - self.bars) * smoothing
+    
+    def start_animation(self, frame_ms):
+        self.frame_ms = frame_ms
+        self.still_frames = 0
+        if self.isVisible():
+            self.timer.start(frame_ms)
+    
+    def showEvent(self, event):
+        if self.is_listening or self.is_speaking or self.is_processing:
+            self.start_animation(self.frame_ms)
+    
+    def hideEvent(self, event):
+        # Nothing to draw while hidden or minimised
+        self.timer.stop()
+            
     def set_listening(self, listening):
         """Set the widget to listening state with voice level animation"""
         self.is_listening = listening
@@ -45,7 +99,7 @@ class VoiceWaveform(QWidget):
         
         if listening:
             self.current_color = self.listening_color
-            self.timer.start(50)  # Update every 50ms
+            self.start_animation(FRAME_MS)
         else:
             self.reset_state()
             
@@ -57,7 +111,7 @@ class VoiceWaveform(QWidget):
         
         if speaking:
             self.current_color = self.speaking_color
-            self.timer.start(50)
+            self.start_animation(FRAME_MS)
         else:
             self.reset_state()
             
@@ -69,7 +123,7 @@ class VoiceWaveform(QWidget):
         
         if processing:
             self.current_color = self.processing_color
-            self.timer.start(70)
+            self.start_animation(PROCESSING_FRAME_MS)
         else:
             self.reset_state()
             
@@ -78,63 +132,68 @@ class VoiceWaveform(QWidget):
         if not (self.is_listening or self.is_speaking or self.is_processing):
             self.current_color = self.idle_color
             self.timer.stop()
-            self.bars = [0] * self.num_bars
-            self.update()
+            self.bars[:] = 0
+            self.painted[:] = 0
+            self.update(self.bars_rect())
     
     def update_waveform(self):
         """Update the waveform animation based on current state"""
-        if self.is_listening:
-            # Simulate microphone input with random heights
-            for i in range(self.num_bars):
-                # Random height with temporal coherence (smoother changes)
-                self.target_heights[i] = min(self.waveform_height, 
-                                           max(5, self.target_heights[i] + random.uniform(-8, 8)))
-                # Gradually move toward target height
-                self.bars[i] += (self.target_heights[i] - self.bars[i]) * 0.3
+        input_levels = self.input_meter.levels() if self.input_meter else None
+        output_levels = self.output_meter.levels() if self.output_meter else None
+        
+        if self.is_listening and input_levels is not None:
+            self.follow_levels(input_levels, 0.5)
+            
+        elif self.is_speaking and output_levels is not None:
+            self.follow_levels(output_levels, 0.5)
+            
+        elif self.is_listening:
+            # Simulate microphone input: random heights with temporal coherence (smoother changes)
+            self.target_heights = np.clip(self.target_heights + self.rng.uniform(-8, 8, self.num_bars),
+                                          5, self.waveform_height)
+            self.bars += (self.target_heights - self.bars) * 0.3
                 
         elif self.is_speaking:
-            # Simulate speech output pattern
-            for i in range(self.num_bars):
-                if i % 2 == 0:  # Alternate bars for wave-like pattern
-                    self.target_heights[i] = random.uniform(10, self.waveform_height)
-                else:
-                    self.target_heights[i] = random.uniform(5, self.waveform_height - 10)
-                # Smoother transitions
-                self.bars[i] += (self.target_heights[i] - self.bars[i]) * 0.4
+            # Simulate speech output: alternate bars for a wave-like pattern
+            self.target_heights = np.where(self.even_bars,
+                                           self.rng.uniform(10, self.waveform_height, self.num_bars),
+                                           self.rng.uniform(5, self.waveform_height - 10, self.num_bars))
+            self.bars += (self.target_heights - self.bars) * 0.4
                 
         elif self.is_processing:
-            # Create a pulsing circle effect
-            pulse = (math.sin(self.pulse_phase) + 1) / 2  # 0 to 1
-            height = 5 + pulse * (self.waveform_height - 10)
-            
-            # Create a circular pattern
-            for i in range(self.num_bars):
-                angle = 2 * math.pi * i / self.num_bars
-                phase_offset = 2 * math.pi * (i / self.num_bars)
-                bar_pulse = (math.sin(self.pulse_phase + phase_offset) + 1) / 2
-                self.bars[i] = 5 + bar_pulse * (self.waveform_height - 10)
-            
-            self.pulse_phase += 0.15
+            # A pulse travelling around the bars, read from the precomputed cycle
+            self.bars[:] = self.pulse_table[self.pulse_frame]
+            self.pulse_frame = (self.pulse_frame + 1) % len(self.pulse_table)
                 
-        self.update()  # Trigger repaint
-        
-    @property
-    def pulse_phase(self):
-        return self._pulse_phase
-        
-    @pulse_phase.setter
-    def pulse_phase(self, value):
-        self._pulse_phase = value
+        self.repaint_if_changed()
+        
+    def repaint_if_changed(self):
+        """Repaint the bars if any drawn height changed; slow the timer while they are still"""
+        heights = self.bars.astype(np.int32)
+        if np.array_equal(heights, self.painted):
+            self.still_frames += 1
+            if self.still_frames == STILL_FRAMES:
+                self.timer.setInterval(STILL_FRAME_MS)
+            return
+        if self.still_frames >= STILL_FRAMES:
+            self.timer.setInterval(self.frame_ms)
+        self.still_frames = 0
+        self.painted = heights
+        self.update(self.bars_rect())
+        
+    def bars_rect(self):
+        """The area the bars are drawn in"""
+        total_width = self.num_bars * (self.bar_spacing + 2)
+        top = self.height() // 2 - self.waveform_height // 2 - 1
+        return QRect((self.width() - total_width) // 2, top, total_width, self.waveform_height + 2)
     
     def paintEvent(self, event):
         """Draw the waveform bars"""
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         
-        # Calculate total width needed for bars
-        total_width = self.num_bars * (self.bar_spacing + 2)
-        
         # Center bars horizontally and vertically
+        total_width = self.num_bars * (self.bar_spacing + 2)
         start_x = (self.width() - total_width) // 2
         center_y = self.height() // 2
         
@@ -142,12 +201,10 @@ class VoiceWaveform(QWidget):
         painter.setPen(Qt.NoPen)
         painter.setBrush(QBrush(self.current_color))
         
-        for i, height in enumerate(self.bars):
-            x = start_x + i * (self.bar_spacing + 2)
-            y = center_y - height // 2
-            
-            # Draw rounded bar
-            painter.drawRoundedRect(x, y, 2, height, 1, 1)
+        for i, height in enumerate(self.painted.tolist()):
+            if height:
+                # Draw rounded bar
+                painter.drawRoundedRect(start_x + i * (self.bar_spacing + 2), center_y - height // 2, 2, height, 1, 1)
 
 
 class SiriBubbleWindow(QMainWindow):
@@ -193,14 +250,22 @@ class SiriBubbleWindow(QMainWindow):
         self.move(screen_geometry.width() - self.width() - 50, 
                  screen_geometry.height() - self.height() - 100)
         
+        # Bubble background, drawn once per size and reused for every repaint
+        self.background = None
+        
         # Bubble state
         self.expanded = False
         self.dragging = False
         self.offset = QPoint()
         
-    def paintEvent(self, event):
-        """Draw the bubble background"""
-        painter = QPainter(self)
+    def render_background(self):
+        """Draw the rounded bubble into a pixmap at the screen's pixel density"""
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(round(self.width() * ratio), round(self.height() * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        
+        painter = QPainter(pixmap)
         painter.setRenderHint(QPainter.Antialiasing)
         
         # Create bubble background path
@@ -213,6 +278,20 @@ class SiriBubbleWindow(QMainWindow):
         # Draw subtle border
         painter.setPen(QPen(QColor(200, 200, 200, 30), 1))
         painter.drawPath(path)
+        painter.end()
+        return pixmap
+        
+    def resizeEvent(self, event):
+        self.background = None
+        super().resizeEvent(event)
+        
+    def paintEvent(self, event):
+        """Draw the bubble background"""
+        if self.background is None or self.background.devicePixelRatio() != self.devicePixelRatioF():
+            self.background = self.render_background()
+        # Only the exposed part is copied, e.g. just the waveform while it animates
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.background)
         
     def mousePressEvent(self, event):
         """Handle mouse press for dragging the bubble"""
@@ -259,6 +338,11 @@ class SiriBubbleWindow(QMainWindow):
         """Set the displayed word"""
         self.word_label.setText(word)
         
+    def show_warming_up(self):
+        """Show that models and connections are still loading"""
+        self.word_label.setText("Warming up...")
+        self.waveform.set_processing(True)
+        
     def start_listening(self):
         """Start listening animation"""
         self.word_label.setText("Listening...")
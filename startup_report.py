@@ -0,0 +1,27 @@
+import json
+import time
+
+
+class StartupReport:
+    """Records how long each startup stage took, measured from process start"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name):
+        """Record a milestone once; returns True the first time"""
+        if name in self.marks:
+            return False
+        self.marks[name] = time.perf_counter() - self.started
+        return True
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.marks.items())
+
+    def write(self, path):
+        """Append this run's milestones as one JSON line, for tracking regressions"""
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  "marks_ms": {name: round(seconds * 1000, 1) for name, seconds in self.marks.items()}}
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
@@ -0,0 +1,182 @@
+import sys
+import json
+import time
+import threading
+import numpy as np
+
+from batch_writer import BatchWriter
+
+# Stage spans reported per turn: (name, start mark, end mark)
+STAGES = (
+    ("endpoint_wait", "speech_end", "endpoint"),
+    ("asr_finalize", "endpoint", "asr_final"),
+    ("dispatch", "asr_final", "reply_start"),
+    ("llm_first_token", "llm_request", "llm_first_token"),
+    ("llm_total", "llm_request", "llm_done"),
+    ("tts_first_byte", "tts_request", "tts_first_byte"),
+    ("time_to_audio", "speech_end", "playback_start"),
+    ("output_start", "playback_start", "first_sample"),
+    ("time_to_first_sample", "speech_end", "first_sample"),
+    ("playback", "playback_start", "playback_end"),
+    ("back_to_listening", "playback_end", "listening"),
+    ("turn", "speech_end", "listening"),
+)
+
+# Work that can run at the same time within a turn: (name, start mark, end mark).
+# Each stage's overlap is how long it ran alongside at least one of the others.
+OVERLAP_STAGES = (
+    ("asr", "speech_start", "asr_final"),
+    ("llm", "llm_request", "llm_done"),
+    ("tts", "tts_request", "tts_done"),
+    ("playback", "playback_start", "playback_end"),
+    ("mic_reopen", "mic_reopen", "mic_ready"),
+)
+
+# Spans left out when blaming slow turns: totals, and playback, which depends on reply length
+LATENCY_EXCLUDED = ("turn", "time_to_audio", "time_to_first_sample", "llm_total", "playback")
+
+
+class TurnTrace:
+    """Timestamps for the stages of one conversational turn
+
+    Marks can come from any thread; each is kept the first time it is set.
+    finish() hands the turn to the tracer to be written.
+    """
+
+    def __init__(self, tracer, turn_id, started=None):
+        self.tracer = tracer
+        self.turn_id = turn_id
+        self.started = time.perf_counter() if started is None else started
+        self.marks = {}
+        self.tags = {}
+        self.finished = False
+
+    def mark(self, name, at=None):
+        if name not in self.marks:
+            self.marks[name] = (time.perf_counter() if at is None else at) - self.started
+
+    def finish(self, outcome="complete"):
+        if self.finished:
+            return
+        self.finished = True
+        self.tracer.write(self.record(outcome))
+
+    def record(self, outcome):
+        marks_ms = {name: round(seconds * 1000, 1) for name, seconds in self.marks.items()}
+        stages_ms = {name: round(marks_ms[end] - marks_ms[start], 1)
+                     for name, start, end in STAGES if start in marks_ms and end in marks_ms}
+        return {"turn": self.turn_id, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "outcome": outcome, **self.tags, "marks_ms": marks_ms, "stages_ms": stages_ms,
+                "overlap_ms": overlaps(marks_ms)}
+
+
+def overlaps(marks_ms):
+    """For each stage in OVERLAP_STAGES, the ms it ran while another stage was running"""
+    spans = {name: (marks_ms[start], marks_ms[end]) for name, start, end in OVERLAP_STAGES
+             if start in marks_ms and end in marks_ms and marks_ms[end] > marks_ms[start]}
+    result = {}
+    for name, (start, end) in spans.items():
+        # Clip the other stages to this one and merge them, so time under two others counts once
+        others = sorted((max(start, s), min(end, e)) for other, (s, e) in spans.items() if other != name)
+        covered = 0.0
+        reach = start
+        for s, e in others:
+            s = max(s, reach)
+            if e > s:
+                covered += e - s
+                reach = e
+        result[name] = round(covered, 1)
+    return result
+
+
+class Tracer(BatchWriter):
+    """Writes finished turn traces as JSON lines from a background thread"""
+
+    def __init__(self, path, enabled=True, max_pending=1000):
+        super().__init__(enabled and bool(path), max_pending)
+        self.path = path
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.start_writer("trace-writer")
+
+    def start_turn(self, started=None):
+        with self.lock:
+            self.next_id += 1
+            return TurnTrace(self, self.next_id, started)
+
+    def write_batch(self, records, stop):
+        if not records:
+            return
+        try:
+            with open(self.path, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Could not write turn trace: {e}")
+
+
+def load_traces(path):
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # A torn final line from a crash
+    return records
+
+
+def report(records):
+    """Per-stage p50/p95/p99 and which stage dominates the slowest turns"""
+    lines = [f"{len(records)} turns"]
+    lines.append(f"{'stage':<20}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, _, _ in STAGES:
+        values = np.array([r["stages_ms"][name] for r in records if name in r.get("stages_ms", {})])
+        if not len(values):
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        lines.append(f"{name:<20}{len(values):>7}{p50:>9.0f}{p95:>9.0f}{p99:>9.0f}{values.max():>9.0f}")
+
+    # For turns slower than p95, count which stage took the longest
+    turns = [r for r in records if "turn" in r.get("stages_ms", {})]
+    if turns:
+        cutoff = np.percentile([r["stages_ms"]["turn"] for r in turns], 95)
+        blame = {}
+        for r in turns:
+            if r["stages_ms"]["turn"] < cutoff:
+                continue
+            parts = {name: ms for name, ms in r["stages_ms"].items()
+                     if name not in LATENCY_EXCLUDED}
+            if parts:
+                worst = max(parts, key=parts.get)
+                blame[worst] = blame.get(worst, 0) + 1
+        if blame:
+            ranked = ", ".join(f"{name} {count}" for name, count in sorted(blame.items(), key=lambda item: -item[1]))
+            lines.append(f"Slowest stage in turns at or above p95 ({cutoff:.0f} ms): {ranked}")
+
+    # How much of each stage ran alongside others: the pipelining that shortens turns
+    overlap_lines = []
+    for name, start, end in OVERLAP_STAGES:
+        pairs = [(r["overlap_ms"][name], r["marks_ms"][end] - r["marks_ms"][start])
+                 for r in records if name in r.get("overlap_ms", {})]
+        if pairs:
+            overlapped = sum(o for o, _ in pairs)
+            total = sum(d for _, d in pairs)
+            overlap_lines.append(f"{name} {overlapped / len(pairs):.0f} ms ({overlapped / total:.0%})")
+    if overlap_lines:
+        lines.append("Mean overlap with other stages: " + ", ".join(overlap_lines))
+
+    outcomes = {}
+    for r in records:
+        outcomes[r.get("outcome")] = outcomes.get(r.get("outcome"), 0) + 1
+    lines.append("Outcomes: " + ", ".join(f"{name} {count}" for name, count in outcomes.items()))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "turn_traces.jsonl"
+    try:
+        print(report(load_traces(path)))
+    except FileNotFoundError:
+        print(f"No trace file at {path}")
+        sys.exit(1)
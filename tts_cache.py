@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class TTSCache:
+    """Content-addressed on-disk cache of rendered PCM speech with LRU eviction
+
+    max_bytes=0 turns the cache off.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        # Cached keys and their sizes, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+        self.enabled = max_bytes > 0
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self.load_index()
+
+    def load_index(self):
+        """Rebuild the LRU order from file modification times"""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pcm"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, name[:-len(".pcm")], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def make_key(text, voice, model, instructions):
+        """Hash everything that changes the rendered audio"""
+        payload = json.dumps([text, voice, model, instructions], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + ".pcm")
+
+    def contains(self, key):
+        if not self.enabled:
+            return False
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        """Return cached PCM bytes for key, or None on a miss"""
+        if not self.enabled:
+            return None
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+
+        path = self.path_for(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Touch the file so recency survives a restart
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store PCM bytes for key and evict old entries over the size budget"""
+        if not self.enabled or not data:
+            return
+
+        # Write to a temporary file first so readers never see partial audio
+        path = self.path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        evicted = []
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.remove(self.path_for(old_key))
+            except OSError:
+                pass
@@ -0,0 +1,142 @@
+import time
+import asyncio
+
+from response_cache import normalize
+
+# Stage priorities, highest first. Starting a stage cancels running preemptible
+# stages of lower priority, so background work never competes with a turn.
+FOREGROUND = 0    # Work the user is waiting on
+SPECULATIVE = 1   # Work started before we know it is needed
+BACKGROUND = 2    # Work for later turns, such as the next word's prompt
+
+
+class CancelToken:
+    """Cancels every stage started under it, recording why"""
+
+    def __init__(self, name):
+        self.name = name
+        self.cancelled = False
+        self.reason = None
+        self.tasks = set()
+
+    def cancel(self, reason="cancelled"):
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self.reason = reason
+        for task in list(self.tasks):
+            task.cancel()
+
+
+class Speculation:
+    """A stage started on a guess of the user's answer"""
+
+    def __init__(self, text, token, task, discard):
+        self.text = text
+        self.key = normalize(text)
+        self.token = token
+        self.task = task
+        self.discard = discard
+        self.started = time.perf_counter()
+
+
+class SchedulerStats:
+    """Counts for one or more schedulers, e.g. every session in a process"""
+
+    def __init__(self):
+        self.started = {}
+        self.preempted = 0
+        self.speculations = 0
+        self.speculations_used = 0
+        self.speculations_wasted = 0
+        self.speculation_lead = 0.0  # Seconds that used speculations started ahead of their turn
+
+    def stats(self):
+        return {"stages_started": dict(self.started), "preempted": self.preempted,
+                "speculations": self.speculations, "speculations_used": self.speculations_used,
+                "speculations_wasted": self.speculations_wasted,
+                "speculation_lead_ms": round(self.speculation_lead / self.speculations_used * 1000, 1)
+                if self.speculations_used else None}
+
+
+class TurnScheduler:
+    """Runs the stages of one session's turns as prioritised, cancellable tasks
+
+    start() runs a coroutine as a named stage; stages can be grouped under a
+    CancelToken so a whole turn is cancelled at once. speculate() starts a
+    stage on a guess of the user's answer before the turn is over; claim()
+    hands it over if the final answer turns out the same (ignoring case and
+    punctuation) and cancels it otherwise. A speculation whose result is not
+    claimed is passed to its discard coroutine, so an open stream is closed
+    instead of running on.
+    """
+
+    def __init__(self, stats=None):
+        self.running = {}  # Task -> (stage name, priority, preemptible)
+        self.speculation = None
+        self.stats = stats or SchedulerStats()
+
+    def start(self, name, coro, priority=FOREGROUND, token=None, preemptible=False):
+        """Run coro as a stage, first cancelling preemptible stages of lower priority"""
+        for task, (_, other_priority, other_preemptible) in list(self.running.items()):
+            if other_preemptible and other_priority > priority and not task.done():
+                task.cancel()
+                self.stats.preempted += 1
+
+        task = asyncio.ensure_future(coro)
+        self.running[task] = (name, priority, preemptible)
+        self.stats.started[name] = self.stats.started.get(name, 0) + 1
+        if token is not None:
+            if token.cancelled:
+                task.cancel()
+            token.tasks.add(task)
+            task.add_done_callback(token.tasks.discard)
+        task.add_done_callback(self.finished)
+        return task
+
+    def finished(self, task):
+        self.running.pop(task, None)
+
+    # Speculation
+
+    def speculate(self, name, text, make_coro, discard):
+        """Start make_coro() for the guessed answer text, replacing a different guess"""
+        if self.speculation is not None:
+            if self.speculation.key == normalize(text):
+                return
+            self.drop_speculation("replaced")
+        token = CancelToken(f"speculative {name}")
+        task = self.start(name, make_coro(), SPECULATIVE, token)
+        self.speculation = Speculation(text, token, task, discard)
+        self.stats.speculations += 1
+
+    def claim(self, text):
+        """The Speculation for this answer, or None (cancelling a guess of anything else)"""
+        speculation = self.speculation
+        if speculation is None:
+            return None
+        if speculation.key != normalize(text) or speculation.task.cancelled():
+            self.drop_speculation("answer changed")
+            return None
+        self.speculation = None
+        self.stats.speculations_used += 1
+        self.stats.speculation_lead += time.perf_counter() - speculation.started
+        return speculation
+
+    def drop_speculation(self, reason="cancelled"):
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return
+        self.stats.speculations_wasted += 1
+        speculation.token.cancel(reason)
+        speculation.task.add_done_callback(lambda task: self.discard_result(speculation, task))
+
+    @staticmethod
+    def discard_result(speculation, task):
+        if not task.cancelled() and task.exception() is None:
+            asyncio.ensure_future(speculation.discard(task.result()))
+
+    def cancel_all(self):
+        self.drop_speculation("closing")
+        for task in list(self.running):
+            task.cancel()
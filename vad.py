@@ -0,0 +1,118 @@
+import numpy as np
+
+
+class EnergyEndpointer:
+    """Energy-based voice activity detector that decides when a spoken turn is over
+
+    Blocks of int16 audio are split into short frames and compared against an
+    adaptive noise floor. Silent blocks outside the short hangover after speech
+    need not be decoded, and the turn ends after enough trailing silence or
+    when the utterance reaches its maximum length.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=20, trailing_silence_ms=1500,
+                 max_utterance_ms=30000, min_speech_ms=150, hangover_ms=400,
+                 min_rms=300.0, speech_ratio=3.0):
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_ms = frame_ms
+        self.trailing_silence_ms = trailing_silence_ms
+        self.max_utterance_ms = max_utterance_ms
+        self.min_speech_ms = min_speech_ms
+        self.hangover_ms = hangover_ms
+        self.min_rms = min_rms
+        self.speech_ratio = speech_ratio
+
+        self.noise_floor = min_rms / speech_ratio
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance, keeping the learned noise floor"""
+        self.in_speech = False
+        self.speech_ms = 0
+        self.silence_ms = 0
+        self.utterance_ms = 0
+
+    def frame_levels(self, block):
+        """RMS level of each complete frame in an int16 block"""
+        samples = np.frombuffer(block, dtype=np.int16)
+        usable = len(samples) - len(samples) % self.frame_len
+        frames = samples[:usable].reshape(-1, self.frame_len).astype(np.float32)
+        return np.sqrt(np.mean(frames * frames, axis=1))
+
+    def process(self, block):
+        """Feed one block; returns (should_decode, endpoint_reached)"""
+        levels = self.frame_levels(block)
+        threshold = max(self.min_rms, self.noise_floor * self.speech_ratio)
+        is_speech = levels > threshold
+
+        # Track the noise floor on frames that are not speech
+        if not is_speech.all():
+            self.noise_floor = 0.9 * self.noise_floor + 0.1 * float(levels[~is_speech].mean())
+
+        decode = False
+        for speech in is_speech:
+            if speech:
+                self.speech_ms += self.frame_ms
+                self.silence_ms = 0
+                if self.speech_ms >= self.min_speech_ms:
+                    self.in_speech = True
+            else:
+                self.silence_ms += self.frame_ms
+                # Forget short blips (clicks, bumps) that never became speech
+                if not self.in_speech and self.silence_ms > self.hangover_ms:
+                    self.speech_ms = 0
+
+            if self.in_speech:
+                self.utterance_ms += self.frame_ms
+
+            # Decode speech plus a little trailing silence so the recognizer can settle
+            if speech or (self.speech_ms and self.silence_ms <= self.hangover_ms):
+                decode = True
+
+        endpoint = self.in_speech and (self.silence_ms >= self.trailing_silence_ms
+                                       or self.utterance_ms >= self.max_utterance_ms)
+        return decode, endpoint
+
+
+def pcm_rms(samples):
+    """RMS level of an int16 sample array"""
+    if len(samples) == 0:
+        return 0.0
+    samples = samples.astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples)))
+
+
+class BargeInDetector:
+    """Detects the user talking over playback without reacting to the app's own voice
+
+    As a simple echo guard, microphone frames only count as speech when they are
+    louder than both the noise floor and a fraction of the level being played,
+    and the user has to keep talking for min_speech_ms.
+    """
+
+    def __init__(self, endpointer, min_speech_ms=300, echo_ratio=0.5):
+        self.endpointer = endpointer
+        self.min_speech_ms = min_speech_ms
+        self.echo_ratio = echo_ratio
+        self.speech_ms = 0
+
+    def reset(self):
+        self.speech_ms = 0
+
+    def process(self, block, playback_level):
+        """Feed one microphone block; returns True when the user has barged in"""
+        endpointer = self.endpointer
+        levels = endpointer.frame_levels(block)
+        threshold = max(endpointer.min_rms,
+                        endpointer.noise_floor * endpointer.speech_ratio,
+                        playback_level * self.echo_ratio)
+
+        for level in levels:
+            if level > threshold:
+                self.speech_ms += endpointer.frame_ms
+                if self.speech_ms >= self.min_speech_ms:
+                    self.speech_ms = 0
+                    return True
+            else:
+                self.speech_ms = 0
+        return False
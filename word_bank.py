@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import heapq
+import threading
+import numpy as np
+
+DAY = 86400.0
+RETRY_DELAY = 10 * 60  # Seconds before a missed or skipped word comes back
+MIN_EASE = 1.3
+
+
+class WordBank:
+    """Spaced-repetition scheduling over a WordStore with incremental persistence
+
+    Per-word state (ease, interval, due time, last result) lives in NumPy
+    arrays indexed by word id. Words that have been seen sit in a heap keyed
+    by due time; words never seen are handed out in a shuffled order. Picking
+    the next word is O(log n) either way; next_word() only looks, and use()
+    commits the pick. Every state change is appended to a JSONL log, which
+    is replayed on start and compacted when it grows.
+    """
+
+    def __init__(self, store, state_path=None, seed=None):
+        self.store = store
+        self.state_path = state_path
+        self.lock = threading.Lock()
+
+        count = len(store)
+        self.ease = np.full(count, 2.5, dtype=np.float32)
+        self.interval = np.zeros(count, dtype=np.float32)  # Days
+        self.due = np.zeros(count, dtype=np.float64)       # Unix time
+        self.last_result = np.full(count, -1, dtype=np.int8)  # -1 unseen, 0 wrong, 1 right, 2 unsure
+        self.seen = np.zeros(count, dtype=bool)
+
+        # (due, id) for seen words; stale entries are skipped when popped
+        self.heap = []
+        self.new_order = np.random.default_rng(seed).permutation(count).astype(np.int32)
+        self.new_cursor = 0
+
+        self.log_lines = 0
+        self.answered = 0
+        if state_path and os.path.exists(state_path):
+            self.load()
+
+    def load(self):
+        """Replay the state log"""
+        with open(self.state_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A torn final line from a crash
+                self.log_lines += 1
+                index = self.store.index_of(entry["word"])
+                if index is None:
+                    continue  # The word was removed from the list
+                self.ease[index] = entry["ease"]
+                self.interval[index] = entry["interval"]
+                self.due[index] = entry["due"]
+                self.last_result[index] = entry["last"]
+                self.seen[index] = True
+
+        seen_ids = np.flatnonzero(self.seen)
+        self.answered = int(np.count_nonzero(self.last_result >= 0))
+        self.heap = list(zip(self.due[seen_ids].tolist(), seen_ids.tolist()))
+        heapq.heapify(self.heap)
+
+    def next_word(self, exclude=None, now=None):
+        """The next word due: the most overdue seen word, otherwise a new one
+
+        Only looks; nothing changes until the word is passed to use(), so a
+        prefetch that is thrown away leaves the schedule as it was.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            return self.store.words[self.peek_next(now, exclude)]
+
+    def use(self, word, now=None):
+        """Mark a word as shown, pushing it back a little so an abandoned word isn't picked again at once"""
+        index = self.store.index_of(word)
+        if index is None:
+            return
+        now = time.time() if now is None else now
+        with self.lock:
+            self.seen[index] = True
+            due = max(self.due[index], now + RETRY_DELAY)
+            if due != self.due[index]:
+                self.schedule(index, due)
+
+    def peek_next(self, now, exclude):
+        self.drop_stale()
+        if self.heap and self.heap[0][0] <= now and self.store.words[self.heap[0][1]] != exclude:
+            return self.heap[0][1]
+
+        # Skip new words that have been shown since; they are in the heap now
+        while self.new_cursor < len(self.new_order) and self.seen[self.new_order[self.new_cursor]]:
+            self.new_cursor += 1
+        position = self.new_cursor
+        while position < len(self.new_order):
+            index = int(self.new_order[position])
+            position += 1
+            if not self.seen[index] and self.store.words[index] != exclude:
+                return index
+
+        # Everything has been seen and nothing is due yet; take the earliest
+        if self.heap:
+            return self.heap[0][1]
+        return 0
+
+    def drop_stale(self):
+        while self.heap and self.heap[0][0] != self.due[self.heap[0][1]]:
+            heapq.heappop(self.heap)
+
+    def schedule(self, index, due):
+        self.due[index] = due
+        heapq.heappush(self.heap, (float(due), int(index)))
+
+    def record(self, word, result, now=None):
+        """Update a word after an answer; result is True, False or None (unsure)"""
+        index = self.store.index_of(word)
+        if index is None:
+            return
+        now = time.time() if now is None else now
+
+        with self.lock:
+            if self.last_result[index] < 0:
+                self.answered += 1
+            if result is True:
+                # SM-2 style growth: 1 day, then 6 days, then interval times ease
+                interval = float(self.interval[index])
+                interval = 1.0 if interval < 1 else (6.0 if interval < 6 else interval * float(self.ease[index]))
+                self.interval[index] = interval
+                self.ease[index] = self.ease[index] + 0.1
+                self.last_result[index] = 1
+                due = now + interval * DAY
+            elif result is False:
+                self.interval[index] = 0.0
+                self.ease[index] = max(MIN_EASE, self.ease[index] - 0.2)
+                self.last_result[index] = 0
+                due = now + RETRY_DELAY
+            else:
+                # Partly right: keep the interval (at least a day) and the ease
+                self.interval[index] = max(1.0, self.interval[index])
+                self.last_result[index] = 2
+                due = now + float(self.interval[index]) * DAY
+
+            self.seen[index] = True
+            self.schedule(index, due)
+            self.append_log(index)
+
+    def state_entry(self, index):
+        return {"word": self.store.words[index], "ease": round(float(self.ease[index]), 3),
+                "interval": round(float(self.interval[index]), 3), "due": float(self.due[index]),
+                "last": int(self.last_result[index])}
+
+    def append_log(self, index):
+        if not self.state_path:
+            return
+        with open(self.state_path, "a") as f:
+            f.write(json.dumps(self.state_entry(index)) + "\n")
+        self.log_lines += 1
+
+        # Rewrite the log as one line per answered word once it is mostly superseded entries
+        if self.log_lines > 4 * self.answered + 100:
+            self.compact_log()
+
+    def compact_log(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for index in np.flatnonzero(self.last_result >= 0):
+                f.write(json.dumps(self.state_entry(int(index))) + "\n")
+        os.replace(tmp_path, self.state_path)
+        self.log_lines = self.answered
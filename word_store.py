@@ -0,0 +1,105 @@
+import csv
+import random
+from array import array
+
+# Used when the word list file is missing or unreadable
+SAMPLE_WORDS = ['serendipity', 'ephemeral', 'ubiquitous', 'esoteric', 'pragmatic',
+                'eloquent', 'paradox', 'ambiguous', 'meticulous', 'resilient']
+
+
+class PackedStrings:
+    """Sequence of strings packed into one UTF-8 buffer with an offset array
+
+    A million short strings take a few megabytes this way instead of the
+    ~60 bytes of object overhead each one costs in a list.
+    """
+
+    def __init__(self, strings=()):
+        self.data = bytearray()
+        self.offsets = array('q', [0])
+        for string in strings:
+            self.append(string)
+
+    def append(self, string):
+        self.data += string.encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string index out of range")
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class WordStore:
+    """Vocabulary words with their meanings and examples in compact packed arrays"""
+
+    def __init__(self, words, meanings=None, examples=None):
+        self.words = words if isinstance(words, PackedStrings) else PackedStrings(words)
+        count = len(self.words)
+        self.meanings = self.pack(meanings, count)
+        self.examples = self.pack(examples, count)
+        self.sorted_ids = None  # Word ids in alphabetical order, built on first lookup
+
+    @staticmethod
+    def pack(strings, count):
+        if isinstance(strings, PackedStrings):
+            return strings
+        return PackedStrings(strings if strings is not None else [""] * count)
+
+    def __len__(self):
+        return len(self.words)
+
+    def build_index(self):
+        """Sort word ids alphabetically for index_of"""
+        if self.sorted_ids is None:
+            self.sorted_ids = array('l', sorted(range(len(self.words)), key=self.words.__getitem__))
+
+    def index_of(self, word):
+        """Position of word in the list, or None (binary search, O(log n))"""
+        self.build_index()
+
+        low, high = 0, len(self.sorted_ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self.words[self.sorted_ids[middle]] < word:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.sorted_ids) and self.words[self.sorted_ids[low]] == word:
+            return self.sorted_ids[low]
+        return None
+
+    def random_word(self, exclude=None):
+        """Pick a random word, avoiding exclude when there is a choice"""
+        word = self.words[random.randrange(len(self.words))]
+        while word == exclude and len(self.words) > 1:
+            word = self.words[random.randrange(len(self.words))]
+        return word
+
+
+def load_words(path):
+    """Read a word,meaning,example CSV; only the word column is required"""
+    try:
+        words, meanings, examples = PackedStrings(), PackedStrings(), PackedStrings()
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                word = (row.get("word") or "").strip()
+                if word:
+                    words.append(word)
+                    meanings.append((row.get("meaning") or "").strip())
+                    examples.append((row.get("example") or "").strip())
+        if not len(words):
+            raise ValueError("no words found")
+        return WordStore(words, meanings, examples)
+    except Exception as e:
+        print(f"Error loading words list: {e}")
+        return WordStore(SAMPLE_WORDS)